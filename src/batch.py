@@ -0,0 +1,160 @@
+import numpy
+from circuit import Circuit
+from wmc import cnf_index
+
+class BatchEvaluator(object):
+    """Evaluates a compiled Circuit for many weight vectors at once.
+
+    The nodes are grouped by depth. Each depth is evaluated with one gather and one
+    reduceat over the whole batch. As in Circuit.marginals, one upward pass gives the
+    node values and one downward pass their derivatives, and the count with a query
+    is the value times the derivative of its literal node, so every P(query | evidence)
+    takes O(nodes x batch) memory. In log space, products become sums and sums become
+    log-sum-exp."""
+
+    def __init__(self, circuit, weights=None, log_space=False):
+        self.__circuit = circuit
+        self.__log_space = log_space
+        self.__nr_variables = circuit.nr_variables()
+        self.__base = numpy.ones((2, self.__nr_variables))
+        if weights is not None:
+            for (row, column) in enumerate(weights.for_variables(self.__nr_variables, 1.0)):
+                self.__base[row] = numpy.frombuffer(column, dtype=float)
+        self.__prepare()
+
+    def __prepare(self):
+        kinds = numpy.frombuffer(self.__circuit.kinds, dtype=numpy.int8)
+        literals = numpy.frombuffer(self.__circuit.literals, dtype=numpy.int32)
+        offsets = numpy.frombuffer(self.__circuit.offsets, dtype=numpy.int64)
+        edges = numpy.frombuffer(self.__circuit.edges, dtype=numpy.int32)
+        depth = numpy.zeros(len(kinds), dtype=numpy.int64)
+        for node in range(0,len(kinds)):
+            if offsets[node+1] > offsets[node]:
+                depth[node] = depth[edges[offsets[node]:offsets[node+1]]].max() + 1
+        self.__leaves = numpy.nonzero(kinds == Circuit.LITERAL)[0]
+        self.__leaf_literals = literals[self.__leaves]
+        # Conjunctions without children are true, disjunctions without children are false.
+        arity = offsets[1:] - offsets[:-1]
+        self.__true = numpy.nonzero((kinds == Circuit.AND) & (arity == 0))[0]
+        self.__false = numpy.nonzero((kinds == Circuit.OR) & (arity == 0))[0]
+        self.__levels = []
+        for level in range(1,int(depth.max())+1):
+            groups = []
+            for kind in (Circuit.AND, Circuit.OR):
+                nodes = numpy.nonzero((depth == level) & (kinds == kind))[0]
+                if len(nodes) == 0:
+                    continue
+                children = numpy.concatenate([edges[offsets[node]:offsets[node+1]] for node in nodes])
+                starts = numpy.concatenate(([0], numpy.cumsum(arity[nodes])[:-1]))
+                # owners[edge] is the position in nodes of the parent of the edge. The
+                # edges sorted by child give the sums over the parents of every child.
+                owners = numpy.repeat(numpy.arange(len(nodes)), arity[nodes])
+                order = numpy.argsort(children, kind='stable')
+                (targets, child_starts) = numpy.unique(children[order], return_index=True)
+                groups.append((kind, nodes, children, starts, owners, order, targets, child_starts))
+            self.__levels.append(groups)
+
+    def weight_matrix(self, batch_weights, translation, size=None):
+        """Builds a (batch x variables) matrix of positive literal weights.
+
+        batch_weights maps program literals, e.g. choice nodes, to one weight per row.
+        All other variables keep the weight given to the constructor."""
+        if size is None:
+            size = len(next(iter(batch_weights.values()))) if batch_weights else 1
+        matrix = numpy.repeat(self.__base[0:1], size, axis=0)
+        for (lit, values) in batch_weights.items():
+            index = cnf_index(lit, translation)
+            if index is not None:
+                matrix[:, abs(index)-1] = values
+        return matrix
+
+    def evaluate(self, positive, negative=None, evidence=(), queries=()):
+        """Returns the (batch x (1 + queries)) counts: column 0 with the evidence alone
+        and column j with the evidence and query j.
+
+        positive and negative are (batch x variables) literal weights; negative defaults
+        to the weights given to the constructor. evidence and queries are signed CNF
+        variables. In log space, the weights are probabilities and the result is a log."""
+        positive = numpy.atleast_2d(numpy.asarray(positive, dtype=float))
+        batch = positive.shape[0]
+        if negative is None:
+            negative = numpy.repeat(self.__base[1:2], batch, axis=0)
+        negative = numpy.atleast_2d(numpy.asarray(negative, dtype=float))
+        lits = self.__leaf_literals
+        leaf_values = numpy.where(lits > 0, positive[:, numpy.abs(lits)-1], negative[:, numpy.abs(lits)-1]).T
+        # The literals that contradict the evidence are zero.
+        blocked = numpy.isin(lits, [-lit for lit in evidence])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            if self.__log_space:
+                leaf_values = numpy.log(leaf_values)
+                zero, one = -numpy.inf, 0.0
+            else:
+                zero, one = 0.0, 1.0
+            values = numpy.empty((len(self.__circuit), batch))
+            values[self.__leaves] = numpy.where(blocked[:, numpy.newaxis], zero, leaf_values)
+            values[self.__true] = one
+            values[self.__false] = zero
+            for groups in self.__levels:
+                for (kind, nodes, children, starts, _, _, _, _) in groups:
+                    values[nodes] = self.__reduce(kind, values[children], starts)
+            derivatives = self.__differentiate(values, zero, one)
+            result = numpy.empty((batch, 1 + len(queries)))
+            result[:, 0] = values[-1]
+            for (column, lit) in enumerate(queries, 1):
+                node = self.__circuit.literal_node(lit)
+                if node is None:
+                    result[:, column] = zero
+                elif self.__log_space:
+                    result[:, column] = values[node] + derivatives[node]
+                else:
+                    result[:, column] = values[node] * derivatives[node]
+        return result
+
+    def __differentiate(self, values, zero, one):
+        # The downward pass of Circuit.differentiate, a depth at a time from the root.
+        # The derivative of a child of a conjunction is the product of its siblings,
+        # taken without dividing by a zero child value.
+        derivatives = numpy.full(values.shape, zero)
+        derivatives[-1] = one
+        for groups in reversed(self.__levels):
+            for (kind, nodes, children, starts, owners, order, targets, child_starts) in groups:
+                contributions = derivatives[nodes][owners]
+                if kind == Circuit.AND:
+                    gathered = values[children]
+                    is_zero = gathered == zero
+                    zeros = numpy.add.reduceat(is_zero, starts, axis=0)[owners]
+                    gathered[is_zero] = one
+                    product = self.__reduce(Circuit.AND, gathered, starts)[owners]
+                    if self.__log_space:
+                        siblings = numpy.where(zeros == 0, product - gathered, numpy.where((zeros == 1) & is_zero, product, zero))
+                        contributions = contributions + siblings
+                    else:
+                        siblings = numpy.where(zeros == 0, product / gathered, numpy.where((zeros == 1) & is_zero, product, zero))
+                        contributions = contributions * siblings
+                summed = self.__reduce(Circuit.OR, contributions[order], child_starts)
+                if self.__log_space:
+                    derivatives[targets] = numpy.logaddexp(derivatives[targets], summed)
+                else:
+                    derivatives[targets] += summed
+        return derivatives
+
+    def __reduce(self, kind, gathered, starts):
+        if not self.__log_space:
+            if kind == Circuit.AND:
+                return numpy.multiply.reduceat(gathered, starts, axis=0)
+            return numpy.add.reduceat(gathered, starts, axis=0)
+        if kind == Circuit.AND:
+            return numpy.add.reduceat(gathered, starts, axis=0)
+        maximum = numpy.maximum.reduceat(gathered, starts, axis=0)
+        maximum[numpy.isinf(maximum)] = 0.0
+        lengths = numpy.diff(numpy.append(starts, len(gathered)))
+        shifted = numpy.exp(gathered - numpy.repeat(maximum, lengths, axis=0))
+        return numpy.log(numpy.add.reduceat(shifted, starts, axis=0)) + maximum
+
+    def probabilities(self, positive, queries, evidence=(), negative=None):
+        """Returns the (batch x queries) matrix of P(query | evidence); rows with impossible evidence are nan."""
+        values = self.evaluate(positive, negative, evidence, queries)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            if self.__log_space:
+                return numpy.exp(values[:, 1:] - values[:, 0:1])
+            return values[:, 1:] / values[:, 0:1]
@@ -0,0 +1,547 @@
+#! /usr/bin/env python3
+
+import sys, time, os, tempfile, random, json, argparse, contextlib, platform, multiprocessing
+from logic import Literal, LogicProgram, CompactCNF, DimacsWriter
+from weights import Weights, VariableWeights
+from loop_breaking import LoopBreaker
+from clarks_completion import ClarksCompletion
+from simplify import CNFSimplifier
+from relevance import RelevancePruner
+from ground import GroundProbLogParser, RuleParser, ParseError
+from wmc import WeightedModelCounter
+from circuit import Compiler
+from metrics import Metrics, program_sizes, cnf_sizes
+from binary import BinaryWriter, BinaryModel
+
+# Disjunctions above these sizes give too many pairwise clauses, or take too long to count.
+PAIRWISE_LIMIT = 2000
+COUNTING_LIMIT = 300
+
+# Reachability programs are chains of dense clusters of this many nodes. Loop breaking
+# is exponential in the size of a cycle, so one dense graph of thousands of nodes would
+# never finish.
+CLUSTER_SIZE = 10
+CLUSTER_DEGREE = 3
+
+# The suite keeps the fastest of this many runs of every stage. A stage is a regression
+# when it is this much slower than the baseline, and the difference is above the noise
+# of timing small stages.
+REPEATS = 3
+TOLERANCE = 1.25
+MIN_REGRESSION = 0.05
+
+class StringLiteral(object) :
+    # The string-hashed literal that Literal replaced, kept as a reference point.
+    def __init__(self, atom, truth_value) :
+        self.atom, self.truth_value = atom, truth_value
+
+    def __str__(self) :
+        if self.truth_value :
+            return str(self.atom)
+        else :
+            return '-' + str(self.atom)
+
+    def __eq__(self, other) :
+        return str(self) == str(other)
+
+    def __hash__(self) :
+        return hash(str(self))
+
+    def __neg__(self) :
+        return StringLiteral(self.atom, not self.truth_value)
+
+class SplittingRuleParser(object) :
+    # The RuleParser that split on every separator and glued the parts back together,
+    # kept as a reference point.
+    def __call__(self, rule) :
+        (head, body) = self.__split_head_body(rule[:-1])
+        head = self.__parse_head(head)
+        body = self.__parse_body(body)
+        return (head,body)
+
+    def __split_head_body(self, rule) :
+        parts = self.__split(rule,':-','<-')
+        if len(parts) == 1 :
+            return (parts[0],'true')
+        elif len(parts) == 2 :
+            return (parts[0],parts[1])
+        else :
+            raise ParseError('more than one :- in rule: ' + rule)
+
+    def __parse_head(self, head) :
+        if len(self.__split(head, ',')) > 1 :
+            raise ParseError("heads of rules can't contain conjunction: '" + head)
+        atoms = self.__split(head,';')
+        result = []
+        for atom in atoms :
+            parts = self.__split(atom,'::')
+            if len(parts) == 1 :
+                prob = '1.0'
+                pred = Literal.parse(atom.strip())
+            elif len(parts) == 2 :
+                prob = parts[0].strip()
+                pred = Literal.parse(parts[1].strip())
+            else :
+                raise ParseError('more than one :: in head: ' + head)
+            if not pred.truth_value :
+                raise ParseError('no negation in the head of rules supported: ' + head)
+            result.append((prob,pred))
+        return result
+
+    def __parse_body(self,body) :
+        if len(self.__split(body,';')) > 1 :
+            raise ParseError("bodies of rules can't contain disjunctions: '" + body)
+        result = []
+        for atom in self.__split(body,',') :
+            atom = atom.strip()
+            if atom != 'true' :
+                result.append(Literal.parse(atom))
+        return result
+
+    def __split(self,string,*separators) :
+        parts = [string]
+        for separator in separators :
+            new_parts = []
+            for part in parts :
+                new_parts.extend(part.split(separator))
+            parts = new_parts
+        singleQuoted = False
+        doubleQuoted = False
+        bracketCount = 0
+        result = ['']
+        for part in parts :
+            for char in part :
+                if char == "'" :
+                    if not doubleQuoted :
+                        singleQuoted = not singleQuoted
+                elif char == '"' :
+                    if not singleQuoted :
+                        doubleQuoted = not doubleQuoted
+                elif char == '(' :
+                    bracketCount += 1
+                elif char == ')' :
+                    bracketCount -= 1
+            result[-1] += part
+            if not singleQuoted and not doubleQuoted and not bracketCount :
+                result.append('')
+            else :
+                result[-1] += separator[0]
+        del result[-1]
+        if singleQuoted :
+            raise ParseError('single quotes not closed: ' + string)
+        if doubleQuoted :
+            raise ParseError('double quoted not closed: ' + string)
+        if bracketCount :
+            raise ParseError('wrong brackets: ' + string)
+        return result
+
+def measure(function, *args) :
+    start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - start, result)
+
+def report(name, size, seconds, reference=None) :
+    line = '%-30s %10d %10.3fs' % (name, size, seconds)
+    if reference :
+        line += '  speedup: %.2fx' % (reference / seconds)
+    print(line)
+
+def literal_workload(literal_class, size) :
+    literals = [literal_class('atom_' + str(i) + '(a,b)', True) for i in range(0,size)]
+    table = {}
+    for lit in literals :
+        table[lit] = [set([lit, -lit])]
+    hits = 0
+    for _ in range(0,5) :
+        for lit in literals :
+            if lit in table and -lit in table[lit][0] :
+                hits += 1
+    return hits
+
+def bench_literals(sizes) :
+    for size in sizes :
+        (reference, _) = measure(literal_workload, StringLiteral, size)
+        (seconds, _) = measure(literal_workload, Literal, size)
+        report('string literals', size, reference)
+        report('interned literals', size, seconds, reference)
+
+def probabilistic_fact(weights, name, probability) :
+    choice = Literal(name, True)
+    weights[choice] = probability
+    weights[-choice] = 1.0
+    return choice
+
+def chain_program(size) :
+    program, weights = LogicProgram(), Weights()
+    for i in range(0,size) :
+        choice = probabilistic_fact(weights, 'c_' + str(i), 0.5)
+        body = [choice]
+        if i + 1 < size :
+            body.append(Literal('a_' + str(i+1), True))
+        program.add_rule(Literal('a_' + str(i), True), body)
+    return (program, weights, set([Literal('a_0', True)]))
+
+def wide_program(size) :
+    program, weights = LogicProgram(), Weights()
+    root = Literal('root', True)
+    for i in range(0,size) :
+        choice = probabilistic_fact(weights, 'c_' + str(i), 0.5)
+        atom = Literal('a_' + str(i), True)
+        program.add_rule(atom, [choice])
+        program.add_rule(root, [atom])
+    return (program, weights, set([root]))
+
+def bench_completion(sizes) :
+    for (name, generator) in (('chain', chain_program), ('wide', wide_program)) :
+        for size in sizes :
+            (program, weights, queries) = generator(size)
+            (seconds, (cnf, _, _)) = measure(ClarksCompletion(compact=True), program, weights, queries)
+            report('completion ' + name, size, seconds)
+            print('%-30s %10d clauses, %d variables' % ('', len(cnf), cnf.nr_variables()))
+
+def grounded_chain_program(size) :
+    (_, (program, constraints, weights, queries, evidence)) = parse_lpad(*chain_lpad(size))
+    (program, weights, evidence, constraints) = LoopBreaker()(program, weights, queries, evidence, constraints)
+    return (program, weights, queries, constraints)
+
+def bench_simplify(sizes) :
+    generators = (('chain', chain_program), ('wide', wide_program), ('grounded chain', grounded_chain_program))
+    for (name, generator) in generators :
+        for size in sizes :
+            (program, weights, queries, constraints) = (generator(size) + ((),))[:4]
+            (cnf, translation, cnf_weights) = ClarksCompletion(compact=True)(program, weights, queries, constraints)
+            simplifier = CNFSimplifier()
+            (seconds, (simplified, _, _)) = measure(simplifier, cnf, translation, cnf_weights, queries)
+            report('simplify ' + name, size, seconds)
+            print('%-30s %10d -> %d clauses, %d -> %d variables, %d -> %d literals' % ('',
+                len(cnf), len(simplified), cnf.nr_variables(), simplified.nr_variables(), cnf.nr_literals(), simplified.nr_literals()))
+
+def bench_relevance(sizes) :
+    # The wide program with evidence on every other a_i, half of it negative.
+    for size in sizes :
+        (program, weights, queries) = wide_program(size)
+        evidence = set([Literal('a_' + str(i), i % 4 == 0) for i in range(0,size,2)])
+        pruner = RelevancePruner()
+        (seconds, (pruned, _, implied)) = measure(pruner, program, [], weights, queries, evidence)
+        report('relevance wide', size, seconds)
+        print('%-30s %10d -> %d rules, %d evidence' % ('', sum(len(program[head]) for head in program), sum(len(pruned[head]) for head in pruned), len(implied)))
+
+def bench_counting(sizes) :
+    for size in sizes :
+        (program, weights, queries, constraints) = grounded_chain_program(size)
+        (cnf, translation, cnf_weights) = ClarksCompletion(compact=True)(program, weights, queries, constraints)
+        counter = WeightedModelCounter(cnf, cnf_weights)
+        (seconds, _) = measure(counter.probabilities, queries, set(), translation)
+        report('counting chain', size, seconds)
+        print('%-30s %10d decisions, %d cache hits' % ('', counter.statistics['decisions'], counter.statistics['cache_hits']))
+        compiler = Compiler()
+        (seconds, circuit) = measure(compiler, cnf)
+        report('compiling chain', size, seconds)
+        print('%-30s %10d decisions, %d nodes' % ('', compiler.statistics['decisions'], len(circuit)))
+
+def text_round_trip(path, cnf, cnf_weights) :
+    with open(path, 'w') as out :
+        DimacsWriter()(cnf, out, cnf_weights)
+    return (CompactCNF.readFromDimacs(path), VariableWeights.readFromDimacs(path))
+
+def binary_round_trip(path, cnf, cnf_weights) :
+    BinaryWriter()(path, cnf=cnf, cnf_weights=cnf_weights)
+    model = BinaryModel(path)
+    return (model.cnf(), model.cnf_weights())
+
+def bench_binary(sizes) :
+    (handle, path) = tempfile.mkstemp()
+    os.close(handle)
+    try :
+        for size in sizes :
+            (program, weights, queries) = chain_program(size)
+            (cnf, _, cnf_weights) = ClarksCompletion(compact=True)(program, weights, queries)
+            (reference, _) = measure(text_round_trip, path, cnf, cnf_weights)
+            text_size = os.path.getsize(path)
+            (seconds, _) = measure(binary_round_trip, path, cnf, cnf_weights)
+            report('dimacs write and read', size, reference)
+            print('%-30s %10d bytes' % ('', text_size))
+            report('binary write and load', size, seconds, reference)
+            print('%-30s %10d bytes' % ('', os.path.getsize(path)))
+            (seconds, _) = measure(lambda : BinaryModel(path).cnf())
+            report('binary load, clauses only', size, seconds)
+    finally :
+        os.remove(path)
+
+def load_program(size) :
+    program = LogicProgram()
+    for i in range(0,size) :
+        program.add_rule(Literal('h_' + str(i), True), [Literal('f_' + str(i), True), Literal('g_' + str(i % 10), True)])
+    for i in range(0,10) :
+        program.add_rule(Literal('g_' + str(i), True), [])
+    for i in range(0,size) :
+        program.add_rule(Literal('f_' + str(i), True), [])
+    return program
+
+def chain_lpad(size) :
+    lines = []
+    for i in range(0,size) :
+        lines.append('0.5::c_' + str(i) + '<-true.')
+        if i + 1 < size :
+            lines.append('0.9::a_' + str(i) + '<-c_' + str(i) + ',a_' + str(i+1) + '.')
+        else :
+            lines.append('0.9::a_' + str(i) + '<-c_' + str(i) + '.')
+    return ('\n'.join(lines) + '\n', 'a_0\n', '')
+
+@contextlib.contextmanager
+def lpad_files(lpad, queries, evidence) :
+    directory = tempfile.mkdtemp()
+    paths = []
+    for (name, text) in (('grounding', lpad), ('queries', queries), ('evidence', evidence)) :
+        paths.append(os.path.join(directory, name))
+        with open(paths[-1], 'w') as out :
+            out.write(text)
+    try :
+        yield paths
+    finally :
+        for path in paths :
+            os.remove(path)
+        os.rmdir(directory)
+
+def parse_lpad(lpad, queries, evidence, encoding='pairwise', workers=1) :
+    with lpad_files(lpad, queries, evidence) as paths :
+        return measure(GroundProbLogParser(encoding, workers), *paths)
+
+def disjunction_lpad(size) :
+    # One annotated disjunction with size alternatives under a probabilistic body.
+    probability = str(1.0 / (size + 1))
+    lines = ['0.5::b<-true.', ';'.join(probability + '::h_' + str(i) for i in range(0,size)) + '<-b.']
+    return ('\n'.join(lines) + '\n', 'h_0\n', '')
+
+def bench_encoding(sizes) :
+    for size in sizes :
+        for encoding in GroundProbLogParser.ENCODINGS :
+            if encoding == 'pairwise' and size > PAIRWISE_LIMIT :
+                print('%-30s %10d skipped, more than %d alternatives' % ('encoding ' + encoding, size, PAIRWISE_LIMIT))
+                continue
+            (_, (program, constraints, weights, queries, evidence)) = parse_lpad(*disjunction_lpad(size), encoding=encoding)
+            (program, weights, evidence, constraints) = LoopBreaker()(program, weights, queries, evidence, constraints)
+            (cnf, translation, cnf_weights) = ClarksCompletion(compact=True)(program, weights, queries | evidence, constraints)
+            if size <= COUNTING_LIMIT :
+                counter = WeightedModelCounter(cnf, cnf_weights)
+                (seconds, _) = measure(counter.probabilities, queries, evidence, translation)
+                report('encoding ' + encoding, size, seconds)
+            else :
+                print('%-30s %10d not counted' % ('encoding ' + encoding, size))
+            print('%-30s %10d clauses, %d literals' % ('', len(cnf), cnf.nr_literals()))
+
+def rule_texts(size) :
+    # Annotated disjunctions over compound terms with quoted arguments and negated bodies.
+    rules = []
+    for i in range(0,size) :
+        head = '0.3::edge(n' + str(i) + ",'x, y'(" + str(i) + '));0.2::mark(n' + str(i) + ',[a,b])'
+        body = 'node(n' + str(i) + '),not(blocked(n' + str(i % 97) + ',"s;t")),\\+ seen(n' + str(i) + ')'
+        rules.append(head + ' :- ' + body + '.')
+    return rules
+
+def parse_rules(parser_class, rules) :
+    parser = parser_class()
+    for rule in rules :
+        parser(rule)
+
+def bench_parser(sizes) :
+    for size in sizes :
+        rules = rule_texts(size)
+        (reference, _) = measure(parse_rules, SplittingRuleParser, rules)
+        (seconds, _) = measure(parse_rules, RuleParser, rules)
+        report('splitting rule parser', size, reference)
+        print('%-30s %10.0f rules/s' % ('', size / reference))
+        report('scanning rule parser', size, seconds, reference)
+        print('%-30s %10.0f rules/s' % ('', size / seconds))
+
+def bench_program(sizes) :
+    for size in sizes :
+        (seconds, program) = measure(load_program, size)
+        report('bulk load', 2 * size, seconds)
+        print('%-30s %10.0f rules/s' % ('', 2 * size / seconds))
+        lpad = chain_lpad(size)
+        (serial, _) = parse_lpad(*lpad)
+        report('parse grounding', 2 * size, serial)
+        print('%-30s %10.0f rules/s' % ('', 2 * size / serial))
+        workers = os.cpu_count() or 1
+        if workers > 1 :
+            (seconds, _) = parse_lpad(*lpad, workers=workers)
+            report('parse grounding, %d workers' % workers, 2 * size, seconds, serial)
+
+def grid_lpad(size) :
+    # Probabilistic moves right and down on a square grid with about size rules.
+    side = max(2, int((size / 4) ** 0.5))
+    lines = []
+    for i in range(0,side) :
+        for j in range(0,side) :
+            for (move, x, y) in (('right', i, j+1), ('down', i+1, j)) :
+                if x < side and y < side :
+                    lines.append('0.6::' + move + '(' + str(i) + ',' + str(j) + ')<-true.')
+                    lines.append('r(' + str(i) + ',' + str(j) + ')<-' + move + '(' + str(i) + ',' + str(j) + '),r(' + str(x) + ',' + str(y) + ').')
+    lines.append('r(' + str(side-1) + ',' + str(side-1) + ')<-true.')
+    return ('\n'.join(lines) + '\n', 'r(0,0)\n', '')
+
+def reachability_lpad(size) :
+    # A ring and random probabilistic edges within each cluster, and one edge to the
+    # next cluster, for about size rules. The query depends on every cluster.
+    rng = random.Random(size)
+    nodes = max(CLUSTER_SIZE, size // (2 * CLUSTER_DEGREE) // CLUSTER_SIZE * CLUSTER_SIZE)
+    lines = []
+    for i in range(0,nodes) :
+        cluster = i - i % CLUSTER_SIZE
+        ring = cluster + (i + 1) % CLUSTER_SIZE
+        others = [j for j in range(cluster, cluster + CLUSTER_SIZE) if j != i and j != ring]
+        targets = [ring] + rng.sample(others, CLUSTER_DEGREE - 1)
+        if i % CLUSTER_SIZE == CLUSTER_SIZE - 1 and i + 1 < nodes :
+            targets.append(i + 1)
+        for j in targets :
+            edge = 'edge(n' + str(i) + ',n' + str(j) + ')'
+            lines.append('0.5::' + edge + '<-true.')
+            lines.append('path(n' + str(i) + ')<-' + edge + ',path(n' + str(j) + ').')
+    lines.append('path(n' + str(nodes - 1) + ')<-true.')
+    return ('\n'.join(lines) + '\n', 'path(n0)\n', '')
+
+def evidence_lpad(size) :
+    # A noisy-or chain with evidence on every other atom and queries on the rest.
+    lines, queries, evidence = [], [], []
+    for i in range(0,size // 3) :
+        lines.append('0.3::c_' + str(i) + '<-true.')
+        lines.append('0.7::a_' + str(i) + '<-c_' + str(i) + '.')
+        if i > 0 :
+            lines.append('0.4::a_' + str(i) + '<-a_' + str(i-1) + '.')
+        if i % 2 :
+            queries.append('a_' + str(i) + '\n')
+        else :
+            evidence.append('a_' + str(i) + ' ' + ('true' if i % 4 else 'false') + '\n')
+    return ('\n'.join(lines) + '\n', ''.join(queries), ''.join(evidence))
+
+# The programs of the suite, with the encoding of their annotated disjunctions. The
+# pairwise encoding of a wide disjunction would dominate every stage.
+SUITE = (
+    ('chain', lambda size : chain_lpad(size // 2), 'pairwise'),
+    ('grid', grid_lpad, 'pairwise'),
+    ('reachability', reachability_lpad, 'pairwise'),
+    ('disjunction', disjunction_lpad, 'sequential'),
+    ('evidence', evidence_lpad, 'pairwise'),
+)
+
+def run_pipeline(metrics, encoding, lpad, queries, evidence) :
+    # Runs every stage that follows grounding on a ground program, like main does.
+    with metrics.stage('rule parser') as stage :
+        parser = RuleParser()
+        rules = [line for line in lpad.split('\n') if line]
+        for rule in rules :
+            parser(rule)
+        stage.record(rules=len(rules))
+    with lpad_files(lpad, queries, evidence) as paths :
+        with metrics.stage('ground parser') as stage :
+            (program, constraints, weights, queries, evidence) = GroundProbLogParser(encoding)(*paths)
+            stage.record(constraints=len(constraints), **program_sizes(program))
+    with metrics.stage('add rule') as stage :
+        copy = LogicProgram()
+        for head in program :
+            for body in program[head] :
+                copy.add_rule(head, body)
+        stage.record(**program_sizes(copy))
+    with metrics.stage('loop breaking') as stage :
+        l = LoopBreaker()
+        (program, weights, evidence, constraints) = l(program, weights, queries, evidence, constraints)
+        stage.record(copies=sum(step['copies'] for step in l.statistics), **program_sizes(program))
+    with metrics.stage('completion') as stage :
+        (cnf, _, cnf_weights) = ClarksCompletion(compact=True)(program, weights, queries | evidence, constraints)
+        stage.record(**cnf_sizes(cnf))
+    with metrics.stage('dimacs') as stage :
+        stage.record(bytes=len(cnf.toDimacs(cnf_weights)))
+
+def suite_runs(name, size, trace_memory, repeats) :
+    # The stages of every run. Atoms are numbered in the order they are interned, which
+    # affects loop breaking, so every program starts from a fresh process.
+    (generator, encoding) = dict((entry[0], entry[1:]) for entry in SUITE)[name]
+    program = generator(size)
+    runs = []
+    for _ in range(0,repeats) :
+        metrics = Metrics(trace_memory)
+        run_pipeline(metrics, encoding, *program)
+        runs.append(metrics.stages)
+    return runs
+
+def suite_key(record) :
+    return (record['program'], record['size'], record['stage'])
+
+def suite_sizes(record) :
+    return dict((key, record[key]) for key in record if not key in ('wall', 'cpu', 'max_rss_kb', 'peak_traced_bytes'))
+
+def bench_suite(sizes, trace_memory=False, save=None, baseline=None, tolerance=TOLERANCE, repeats=REPEATS) :
+    """Runs every stage on every generated program and size. Returns the number of
+    stages that got slower than the baseline, or whose output sizes changed."""
+    reference = {}
+    if baseline :
+        with open(baseline) as f :
+            reference = dict((suite_key(record), record) for record in json.load(f)['records'])
+    records = []
+    regressions = 0
+    context = multiprocessing.get_context('spawn')
+    for (name, _, _) in SUITE :
+        for size in sizes :
+            with context.Pool(1) as pool :
+                runs = pool.apply(suite_runs, (name, size, trace_memory, repeats))
+            for stages in zip(*runs) :
+                record = min(stages, key=lambda stage : stage['wall'])
+                record.update(program=name, size=size)
+                old = reference.get(suite_key(record))
+                report(name + ' ' + record['stage'], size, record['wall'], old and old['wall'])
+                print('%-30s %s' % ('', ', '.join(key + ' ' + str(record[key]) for key in sorted(record)
+                    if isinstance(record[key], int) and key != 'size')))
+                if old is None :
+                    pass
+                elif suite_sizes(old) != suite_sizes(record) :
+                    print('%-30s output changed, baseline: %s' % ('', suite_sizes(old)))
+                    regressions += 1
+                elif record['wall'] > tolerance * old['wall'] and record['wall'] - old['wall'] > MIN_REGRESSION :
+                    print('%-30s regression, baseline %.3fs' % ('', old['wall']))
+                    regressions += 1
+                records.append(record)
+    if save :
+        with open(save, 'w') as out :
+            json.dump({'python' : platform.python_version(), 'records' : records}, out, indent=1, sort_keys=True)
+    if baseline :
+        print('%d regressions against %s' % (regressions, baseline))
+    return regressions
+
+BENCHMARKS = {
+    'binary' : bench_binary,
+    'literals' : bench_literals,
+    'completion' : bench_completion,
+    'counting' : bench_counting,
+    'encoding' : bench_encoding,
+    'parser' : bench_parser,
+    'program' : bench_program,
+    'relevance' : bench_relevance,
+    'simplify' : bench_simplify,
+    'suite' : bench_suite,
+}
+
+def parse_arguments(argv) :
+    parser = argparse.ArgumentParser()
+    parser.add_argument('name', nargs='?', choices=sorted(BENCHMARKS), help='run only this benchmark')
+    parser.add_argument('sizes', nargs='*', type=int, default=[10000, 100000])
+    parser.add_argument('--trace-memory', action='store_true', help='record the peak memory that Python allocates in every suite stage')
+    parser.add_argument('--save', default=None, metavar='FILE', help='write the suite results to this file, to use as a baseline later')
+    parser.add_argument('--baseline', default=None, metavar='FILE', help='compare the suite results to a file written by --save')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='slowdown against the baseline that counts as a regression')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='run every suite stage this many times and keep the fastest')
+    return parser.parse_args(argv)
+
+def main(argv) :
+    args = parse_arguments(argv)
+    names = [args.name] if args.name else sorted(BENCHMARKS)
+    regressions = 0
+    for name in names :
+        if name == 'suite' :
+            regressions += bench_suite(args.sizes, args.trace_memory, args.save, args.baseline, args.tolerance, args.repeats)
+        else :
+            BENCHMARKS[name](args.sizes)
+    return 1 if regressions else 0
+
+if __name__ == '__main__' :
+    sys.exit(main(sys.argv[1:]))
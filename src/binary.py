@@ -0,0 +1,225 @@
+import struct, sys
+from array import array
+from logic import Literal, LogicProgram, CompactCNF
+from weights import Weights, VariableWeights
+from utils import KeyIndexDict, read_mapped
+
+MAGIC = b'PLGB'
+VERSION = 1
+
+# The header is the magic, the version and the number of sections. Every section has a
+# directory entry with its name, typecode, byte offset and number of items.
+HEADER = struct.Struct('<4sII')
+ENTRY = struct.Struct('<24scxxxQQ')
+ALIGNMENT = 8
+TYPECODES = {'B' : 1, 'i' : 4, 'q' : 8, 'd' : 8}
+
+class BinaryWriter(object):
+    """Writes a ground program, a CNF and their weights in one versioned binary file.
+
+    Every part is optional. Atoms are numbered in the file, and their names are stored
+    once. Literals are signed atom numbers. Rules, constraints and clauses are arrays of
+    literals with offsets, like CompactCNF, and weights are float64 arrays. Arrays are
+    little-endian and aligned, so BinaryModel can use them without copying."""
+
+    def __call__(self, filename, program=None, constraints=(), weights=None, queries=(), evidence=(),
+                 cnf=None, cnf_weights=None, translation=None):
+        self.__atoms = KeyIndexDict()
+        self.__sections = []
+        if program is not None:
+            heads, offsets, literals = array('i'), array('q',[0]), array('i')
+            for head in program:
+                for body in program[head]:
+                    heads.append(self.__literal(head))
+                    literals.extend([self.__literal(lit) for lit in body])
+                    offsets.append(len(literals))
+            self.__add('rule_heads', heads)
+            self.__add('rule_offsets', offsets)
+            self.__add('rule_literals', literals)
+        if constraints:
+            self.__add_clauses('constraint', [[self.__literal(lit) for lit in constraint] for constraint in constraints])
+        if weights is not None:
+            lits, values = array('i'), array('d')
+            for lit in weights:
+                lits.append(self.__literal(lit))
+                values.append(weights[lit])
+            self.__add('weight_literals', lits)
+            self.__add('weight_values', values)
+        if queries:
+            self.__add('queries', array('i', [self.__literal(lit) for lit in queries]))
+        if evidence:
+            self.__add('evidence', array('i', [self.__literal(lit) for lit in evidence]))
+        if cnf is not None:
+            self.__add_clauses('cnf', cnf.clauses())
+            self.__add('cnf_variables', array('q', [cnf.nr_variables()]))
+            if cnf_weights is not None:
+                (positive, negative) = cnf_weights.for_variables(cnf.nr_variables())
+                values = array('d', [0.0]) * (2 * len(positive))
+                values[0::2] = positive
+                values[1::2] = negative
+                self.__add('cnf_weights', values)
+        if translation is not None:
+            atoms, lits = array('i'), array('i')
+            for atom in translation:
+                atoms.append(self.__literal(atom))
+                lits.append(translation[atom])
+            self.__add('translation_atoms', atoms)
+            self.__add('translation_literals', lits)
+        names = [str(self.__atoms.getByIndex(i)).encode() for i in range(1,len(self.__atoms)+1)]
+        offsets = array('q',[0])
+        for name in names:
+            offsets.append(offsets[-1] + len(name))
+        self.__sections[:0] = [('atom_names', array('B', b''.join(names))), ('atom_offsets', offsets)]
+        self.__write(filename)
+
+    def __literal(self, lit):
+        index = self.__atoms.add(str(lit.atom))
+        return index if lit.truth_value else -index
+
+    def __add(self, name, values):
+        self.__sections.append((name, values))
+
+    def __add_clauses(self, name, clauses):
+        offsets, literals = array('q',[0]), array('i')
+        for clause in clauses:
+            literals.extend(clause)
+            offsets.append(len(literals))
+        self.__add(name + '_offsets', offsets)
+        self.__add(name + '_literals', literals)
+
+    def __write(self, filename):
+        position = HEADER.size + ENTRY.size * len(self.__sections)
+        entries, blocks = [], []
+        for (name, values) in self.__sections:
+            padding = -position % ALIGNMENT
+            position += padding
+            if sys.byteorder != 'little':
+                values = array(values.typecode, values)
+                values.byteswap()
+            entries.append(ENTRY.pack(name.encode(), values.typecode.encode(), position, len(values)))
+            blocks.append(b'\0' * padding)
+            blocks.append(values.tobytes())
+            position += len(values) * values.itemsize
+        with open(filename,'wb') as out:
+            out.write(HEADER.pack(MAGIC, VERSION, len(self.__sections)))
+            out.writelines(entries)
+            out.writelines(blocks)
+
+class BinaryModel(object):
+    """A file written by BinaryWriter, memory-mapped read-only.
+
+    The arrays of the file, e.g. the clauses of cnf(), are memoryviews on the mapping,
+    so they are not copied and processes that load the same file share its pages. They
+    are read-only. Literals are made, and their atoms interned, when a part that needs
+    them is asked for. A model is pickled as its filename, so it can be passed to
+    worker processes, which map the file again."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.__data = read_mapped(filename)
+        if len(self.__data) < HEADER.size:
+            raise BinaryFormatError('not a binary model: ' + filename)
+        (magic, version, nr_sections) = HEADER.unpack_from(self.__data, 0)
+        if magic != MAGIC:
+            raise BinaryFormatError('not a binary model: ' + filename)
+        if version != VERSION:
+            raise BinaryFormatError(filename + ' has format version ' + str(version) + ', expected ' + str(VERSION))
+        self.__sections = {}
+        view = memoryview(self.__data)
+        for i in range(0,nr_sections):
+            (name, typecode, offset, count) = ENTRY.unpack_from(self.__data, HEADER.size + i * ENTRY.size)
+            (name, typecode) = (name.rstrip(b'\0').decode(), typecode.decode())
+            if not typecode in TYPECODES or array(typecode).itemsize != TYPECODES[typecode]:
+                raise BinaryFormatError('unsupported array type in ' + filename + ': ' + typecode)
+            end = offset + count * TYPECODES[typecode]
+            if end > len(self.__data):
+                raise BinaryFormatError('truncated section ' + name + ' in ' + filename)
+            values = view[offset:end].cast(typecode)
+            if sys.byteorder != 'little':
+                values = array(typecode, values.tobytes())
+                values.byteswap()
+            self.__sections[name] = values
+        self.__literals = None
+
+    def __reduce__(self):
+        return (BinaryModel, (self.filename,))
+
+    def __contains__(self, name):
+        return name in self.__sections
+
+    def array(self, name):
+        """Returns a section of the file as a read-only sequence of numbers."""
+        if not name in self.__sections:
+            raise BinaryFormatError(self.filename + ' has no section ' + name)
+        return self.__sections[name]
+
+    def atoms(self):
+        names, offsets = self.array('atom_names'), self.array('atom_offsets')
+        return [bytes(names[offsets[i]:offsets[i+1]]).decode() for i in range(0,len(offsets)-1)]
+
+    def program(self):
+        program = LogicProgram()
+        heads, offsets, literals = self.array('rule_heads'), self.array('rule_offsets'), self.array('rule_literals')
+        for i in range(0,len(heads)):
+            program.add_rule(self.__literal(heads[i]), [self.__literal(lit) for lit in literals[offsets[i]:offsets[i+1]]])
+        return program
+
+    def constraints(self):
+        if not 'constraint_offsets' in self:
+            return []
+        return [[self.__literal(lit) for lit in clause] for clause in self.__clauses('constraint')]
+
+    def weights(self):
+        weights = Weights()
+        lits, values = self.array('weight_literals'), self.array('weight_values')
+        for i in range(0,len(lits)):
+            weights[self.__literal(lits[i])] = values[i]
+        return weights
+
+    def queries(self):
+        return set([self.__literal(lit) for lit in self.__sections.get('queries',[])])
+
+    def evidence(self):
+        return set([self.__literal(lit) for lit in self.__sections.get('evidence',[])])
+
+    def grounding(self):
+        """Returns the ground program in the order of Grounder results."""
+        return (self.program(), self.constraints(), self.weights(), self.queries(), self.evidence())
+
+    def cnf(self):
+        return CompactCNF(self.array('cnf_literals'), self.array('cnf_offsets'), self.array('cnf_variables')[0])
+
+    def cnf_weights(self):
+        values = self.array('cnf_weights')
+        return VariableWeights(values[0::2], values[1::2])
+
+    def translation(self):
+        """Returns the translation from atoms to CNF variables. It is a KeyIndexDict when
+        the variables are numbered in order, as after completion, and a dict otherwise."""
+        atoms, lits = self.array('translation_atoms'), self.array('translation_literals')
+        if list(lits) == list(range(1,len(lits)+1)):
+            translation = KeyIndexDict()
+        else:
+            translation = {}
+        for i in range(0,len(atoms)):
+            translation[self.__literal(atoms[i])] = lits[i]
+        return translation
+
+    def __clauses(self, name):
+        offsets, literals = self.array(name + '_offsets'), self.array(name + '_literals')
+        for i in range(0,len(offsets)-1):
+            yield literals[offsets[i]:offsets[i+1]]
+
+    def __literal(self, index):
+        if self.__literals is None:
+            self.__literals = [None] + [Literal(name,True) for name in self.atoms()]
+        if index > 0:
+            return self.__literals[index]
+        return -self.__literals[-index]
+
+class BinaryFormatError(Exception):
+    def __init__(self,msg):
+        self.__msg = msg
+
+    def __str__(self):
+        return 'error while reading binary model: ' + self.__msg
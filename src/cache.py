@@ -0,0 +1,68 @@
+import hashlib, os, pickle, tempfile
+
+# Entries are pickles of LogicProgram, Weights and Literal objects. The version is part
+# of every key, so bump it whenever one of these classes changes what it pickles.
+CACHE_VERSION = 2
+
+class GroundingCache(object) :
+    """Content-addressed store for grounding results with least-recently-used eviction.
+
+    An entry that cannot be loaded is a miss."""
+
+    def __init__(self, directory, max_size=1 << 30) :
+        self.__directory = directory
+        self.__max_size = max_size
+        if not os.path.exists(directory) :
+            os.makedirs(directory)
+
+    def key(self, infiles, *extra) :
+        digest = hashlib.sha256()
+        digest.update(b'cache version ' + str(CACHE_VERSION).encode() + b'\0')
+        for filename in infiles :
+            with open(filename, 'rb') as file :
+                for block in iter(lambda : file.read(1 << 20), b'') :
+                    digest.update(block)
+            digest.update(b'\0')
+        for part in extra :
+            digest.update(str(part).encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def __path(self, key) :
+        return os.path.join(self.__directory, key + '.grounding')
+
+    def __contains__(self, key) :
+        return os.path.exists(self.__path(key))
+
+    def get(self, key) :
+        path = self.__path(key)
+        try :
+            with open(path, 'rb') as file :
+                result = pickle.load(file)
+        except Exception :
+            return None
+        os.utime(path, None)
+        return result
+
+    def put(self, key, value) :
+        (handle, tmp_path) = tempfile.mkstemp(dir=self.__directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file :
+            pickle.dump(value, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.__path(key))
+        self.__evict()
+
+    def __evict(self) :
+        entries = []
+        total = 0
+        for name in os.listdir(self.__directory) :
+            if name.endswith('.grounding') :
+                stat = os.stat(os.path.join(self.__directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+        entries.sort()
+        # The newest entry is always kept, even when it exceeds the size bound on its own.
+        for (_, size, name) in entries[:-1] :
+            if total <= self.__max_size :
+                break
+            os.remove(os.path.join(self.__directory, name))
+            total -= size
@@ -0,0 +1,416 @@
+import hashlib, heapq
+from array import array
+from collections import OrderedDict
+from utils import trampoline, read_mapped
+from wmc import Formula, cnf_evidence, conditional_probabilities
+
+class Circuit(object):
+    """Smooth decision-DNNF stored as a flat list of nodes in topological order.
+
+    Every node is a literal, a conjunction or a disjunction. The children of a node
+    are kept in one int buffer with offsets, as in CompactCNF. The last node is the root.
+    A compiled circuit has the cnf_digest of the CNF it was compiled from in digest."""
+
+    LITERAL, AND, OR = 0, 1, 2
+
+    def __init__(self, nr_variables=0):
+        self.__kinds = array('b')
+        self.__literals = array('i')
+        self.__children = array('i')
+        self.__offsets = array('q',[0])
+        self.__literal_nodes = {}
+        self.__nr_variables = nr_variables
+        self.digest = None
+
+    def add_literal(self, lit):
+        if not lit in self.__literal_nodes:
+            self.__literal_nodes[lit] = self.__add_node(self.LITERAL, lit, ())
+            self.__nr_variables = max(self.__nr_variables, abs(lit))
+        return self.__literal_nodes[lit]
+
+    def add_and(self, children):
+        return self.__add_node(self.AND, 0, children)
+
+    def add_or(self, children, decision=0):
+        return self.__add_node(self.OR, decision, children)
+
+    def __add_node(self, kind, literal, children):
+        self.__kinds.append(kind)
+        self.__literals.append(literal)
+        self.__children.extend(children)
+        self.__offsets.append(len(self.__children))
+        return len(self.__kinds) - 1
+
+    def children(self, node):
+        return self.__children[self.__offsets[node]:self.__offsets[node+1]]
+
+    def kind(self, node):
+        return self.__kinds[node]
+
+    def literal(self, node):
+        return self.__literals[node]
+
+    def literal_node(self, lit):
+        return self.__literal_nodes.get(lit)
+
+    def nr_variables(self):
+        return self.__nr_variables
+
+    def nr_edges(self):
+        return len(self.__children)
+
+    def __len__(self):
+        return len(self.__kinds)
+
+    root = property(lambda s : len(s.__kinds) - 1)
+    kinds = property(lambda s : s.__kinds)
+    literals = property(lambda s : s.__literals)
+    edges = property(lambda s : s.__children)
+    offsets = property(lambda s : s.__offsets)
+
+    def evaluate(self, weights, evidence=()):
+        """Upward pass. Returns the value of every node; the literals that contradict the evidence are set to zero."""
+        values = [0.0] * len(self)
+        kinds, literals, children, offsets = self.__kinds, self.__literals, self.__children, self.__offsets
+        blocked = set(-lit for lit in evidence)
+        for node in range(0,len(values)):
+            kind = kinds[node]
+            if kind == self.LITERAL:
+                lit = literals[node]
+                values[node] = 0.0 if lit in blocked else weights[lit]
+            elif kind == self.AND:
+                value = 1.0
+                for child in children[offsets[node]:offsets[node+1]]:
+                    value *= values[child]
+                values[node] = value
+            else:
+                value = 0.0
+                for child in children[offsets[node]:offsets[node+1]]:
+                    value += values[child]
+                values[node] = value
+        return values
+
+    def differentiate(self, values):
+        """Downward pass. Returns the derivative of the root value with respect to every node."""
+        derivatives = [0.0] * len(values)
+        if not values:
+            return derivatives
+        derivatives[-1] = 1.0
+        kinds, children, offsets = self.__kinds, self.__children, self.__offsets
+        for node in range(len(values)-1,-1,-1):
+            derivative = derivatives[node]
+            if derivative == 0 or kinds[node] == self.LITERAL:
+                continue
+            node_children = children[offsets[node]:offsets[node+1]]
+            if kinds[node] == self.OR:
+                for child in node_children:
+                    derivatives[child] += derivative
+                continue
+            # The product of the siblings, without dividing by a zero child value.
+            product = 1.0
+            zeros = 0
+            for child in node_children:
+                if values[child] == 0:
+                    zeros += 1
+                else:
+                    product *= values[child]
+            if zeros == 0:
+                for child in node_children:
+                    derivatives[child] += derivative * product / values[child]
+            elif zeros == 1:
+                for child in node_children:
+                    if values[child] == 0:
+                        derivatives[child] += derivative * product
+        return derivatives
+
+    def marginals(self, weights, evidence=(), values=None):
+        """Returns Z(evidence) and Z(evidence and lit) for every literal in the circuit, from one upward and one downward pass.
+
+        When the node values are given, the upward pass is skipped."""
+        if values is None:
+            values = self.evaluate(weights, evidence)
+        derivatives = self.differentiate(values)
+        result = {}
+        for (lit, node) in self.__literal_nodes.items():
+            result[lit] = values[node] * derivatives[node]
+        return (values[-1] if values else 0.0, result)
+
+    def probabilities(self, weights, queries, evidence, translation):
+        """Returns P(query | evidence) for every query literal, like WeightedModelCounter.probabilities."""
+        assumptions = cnf_evidence(evidence, translation)
+        (normalization, marginals) = self.marginals(self.literal_weights(weights), assumptions)
+        return conditional_probabilities(queries, translation, normalization, lambda index : marginals.get(index, 0.0))
+
+    def literal_weights(self, weights):
+        result = {}
+        (positive, negative) = weights.for_variables(self.__nr_variables, 1.0)
+        for variable in range(1,self.__nr_variables+1):
+            result[variable] = positive[variable-1]
+            result[-variable] = negative[variable-1]
+        return result
+
+    def save(self, filename):
+        """Writes the circuit in the c2d .nnf format, with the digest in a 'c cnf' line."""
+        with open(filename,'w') as out:
+            out.write('nnf ' + str(len(self)) + ' ' + str(self.nr_edges()) + ' ' + str(self.__nr_variables) + '\n')
+            if self.digest is not None:
+                out.write('c cnf ' + self.digest + '\n')
+            lines = []
+            for node in range(0,len(self)):
+                kind = self.__kinds[node]
+                if kind == self.LITERAL:
+                    lines.append('L ' + str(self.__literals[node]))
+                else:
+                    node_children = self.children(node)
+                    line = 'A ' if kind == self.AND else 'O ' + str(self.__literals[node]) + ' '
+                    lines.append(line + ' '.join(map(str,[len(node_children)] + list(node_children))))
+                if len(lines) >= 4096:
+                    out.write('\n'.join(lines) + '\n')
+                    lines = []
+            if lines:
+                out.write('\n'.join(lines) + '\n')
+
+    @classmethod
+    def load(cls, filename):
+        """Reads a circuit in the c2d .nnf format."""
+        data = read_mapped(filename)
+        lines = data[:].decode().splitlines()
+        header = lines[0].split() if lines else []
+        if not header or header[0] != 'nnf':
+            raise CircuitError('not an nnf file: ' + filename)
+        circuit = Circuit(int(header[3]))
+        for line in lines[1:]:
+            parts = line.split()
+            if not parts:
+                continue
+            elif parts[0] == 'c':
+                if parts[1:2] == ['cnf']:
+                    circuit.digest = parts[2]
+            elif parts[0] == 'L':
+                circuit.add_literal(int(parts[1]))
+            elif parts[0] == 'A':
+                circuit.add_and([int(child) for child in parts[2:]])
+            elif parts[0] == 'O':
+                circuit.add_or([int(child) for child in parts[3:]], int(parts[1]))
+            else:
+                raise CircuitError('unknown node in ' + filename + ': ' + line)
+        if len(circuit) != int(header[1]):
+            raise CircuitError('expected ' + header[1] + ' nodes in ' + filename + ' but read ' + str(len(circuit)))
+        return circuit
+
+class IncrementalEvaluator(object):
+    """Keeps the node values of a Circuit up to date under weight and evidence changes.
+
+    A change marks its literal nodes dirty. Only the nodes above them are recomputed,
+    in increasing order, and the propagation stops at nodes whose value did not change.
+    Evidence is applied as indicators on the literal nodes, so changing it never
+    touches the circuit's structure."""
+
+    def __init__(self, circuit, weights, evidence=()):
+        self.__circuit = circuit
+        self.__weights = dict(weights)
+        self.__evidence = set(evidence)
+        self.__parents = [[] for node in range(0,len(circuit))]
+        for node in range(0,len(circuit)):
+            for child in circuit.children(node):
+                self.__parents[child].append(node)
+        self.__values = circuit.evaluate(self.__weights, self.__evidence)
+        self.__dirty = set([])
+        self.statistics = {'updates' : 0, 'recomputed_nodes' : 0}
+
+    def set_weight(self, lit, weight):
+        """Changes the weight of a signed CNF literal."""
+        if self.__weights.get(lit) != weight:
+            self.__weights[lit] = weight
+            self.__mark(lit)
+
+    def set_evidence(self, evidence):
+        """Replaces the evidence, given as signed CNF literals."""
+        evidence = set(evidence)
+        for lit in evidence ^ self.__evidence:
+            self.__mark(-lit)
+        self.__evidence = evidence
+
+    def __mark(self, lit):
+        node = self.__circuit.literal_node(lit)
+        if node is not None:
+            self.__dirty.add(node)
+
+    def values(self):
+        """Returns the node values after recomputing the nodes above the changes."""
+        if self.__dirty:
+            self.__update()
+        return self.__values
+
+    def marginals(self):
+        return self.__circuit.marginals(self.__weights, self.__evidence, self.values())
+
+    def __update(self):
+        circuit, values = self.__circuit, self.__values
+        blocked = set(-lit for lit in self.__evidence)
+        heap = list(self.__dirty)
+        heapq.heapify(heap)
+        queued = set(heap)
+        self.__dirty = set([])
+        self.statistics['updates'] += 1
+        while heap:
+            node = heapq.heappop(heap)
+            kind = circuit.kind(node)
+            if kind == Circuit.LITERAL:
+                lit = circuit.literal(node)
+                value = 0.0 if lit in blocked else self.__weights[lit]
+            elif kind == Circuit.AND:
+                value = 1.0
+                for child in circuit.children(node):
+                    value *= values[child]
+            else:
+                value = 0.0
+                for child in circuit.children(node):
+                    value += values[child]
+            self.statistics['recomputed_nodes'] += 1
+            if value != values[node]:
+                values[node] = value
+                for parent in self.__parents[node]:
+                    if not parent in queued:
+                        queued.add(parent)
+                        heapq.heappush(heap, parent)
+
+class Compiler(object):
+    """Compiles a CNF into a smooth decision-DNNF Circuit.
+
+    Follows the same search as WeightedModelCounter, on the same Formula: a decision,
+    unit propagation and component decomposition. Each cached component becomes a
+    shared node in the circuit. Evicting a component from the cache only loses sharing.
+
+    The component cache is kept between calls. A component is cached under its
+    variables and its clauses, so when a later CNF contains a component that was
+    already compiled, its sub-circuit is copied instead of searched again. This only
+    helps when the CNFs number their variables the same way."""
+
+    def __init__(self, cache_size=1 << 22):
+        self.__cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.__cache_used = 0
+
+    def __call__(self, cnf):
+        self.__smoothing = {}
+        self.__imported = {}
+        # Sorted clauses get their ids in the order of their contents, so the clauses of
+        # a component, in the order of their ids, are the same in every CNF.
+        self.__clauses = sorted(set([tuple(sorted(clause)) for clause in cnf.clauses()]))
+        # As in WeightedModelCounter, the variables up to the largest one that are in no
+        # clause are free, and get smoothing nodes, so they count and have marginals.
+        nr_variables = max([abs(lit) for clause in self.__clauses for lit in clause] or [0])
+        variables = range(1,nr_variables+1)
+        self.__formula = Formula(self.__clauses, nr_variables)
+        self.__circuit = Circuit(nr_variables)
+        self.__circuit.digest = clauses_digest(self.__clauses, cnf.nr_variables())
+        self.statistics = {'decisions' : 0, 'cache_hits' : 0, 'reused_nodes' : 0}
+        node = trampoline(self.__compile_formula(variables))
+        # The root is the last node added, so only an unsatisfiable CNF needs one more.
+        if node is None:
+            self.__circuit.add_or([])
+        self.__forget_old_circuits()
+        return self.__circuit
+
+    def __compile_formula(self, variables):
+        formula = self.__formula
+        mark = formula.mark()
+        node = None
+        if formula.start(()):
+            node = yield self.__compile_branch(mark, variables)
+        formula.undo(mark)
+        return node
+
+    def __compile_component(self, component):
+        (variables, ids, size, branch) = component
+        key = (variables, tuple([self.__clauses[index] for index in ids]))
+        if key in self.__cache:
+            self.statistics['cache_hits'] += 1
+            self.__cache.move_to_end(key)
+            (circuit, node, size) = self.__cache[key]
+            if circuit is not self.__circuit:
+                node = self.__import(circuit, node)
+                self.__cache[key] = (self.__circuit, node, size)
+            return node
+        self.statistics['decisions'] += 1
+        formula = self.__formula
+        branches = []
+        for lit in (branch, -branch):
+            mark = formula.mark()
+            if formula.assign([lit]):
+                branches.append((yield self.__compile_branch(mark, variables)))
+            formula.undo(mark)
+        node = self.__circuit.add_or(branches, branch)
+        self.__store(key, node, size)
+        return node
+
+    def __compile_branch(self, mark, variables):
+        formula = self.__formula
+        children = [self.__circuit.add_literal(lit) for lit in sorted(formula.assigned(mark), key=abs)]
+        (free, parts) = formula.split(variables)
+        for variable in free:
+            children.append(self.__smooth(variable))
+        for component in parts:
+            children.append((yield self.__compile_component(component)))
+        return self.__circuit.add_and(children)
+
+    def __smooth(self, variable):
+        if not variable in self.__smoothing:
+            positive = self.__circuit.add_literal(variable)
+            negative = self.__circuit.add_literal(-variable)
+            self.__smoothing[variable] = self.__circuit.add_or([positive, negative], variable)
+        return self.__smoothing[variable]
+
+    def __import(self, circuit, root):
+        # Children precede their parents, so copying the reachable nodes in increasing order is topological.
+        memo = self.__imported.setdefault(id(circuit), {})
+        reachable = set([])
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if not node in reachable and not node in memo:
+                reachable.add(node)
+                stack.extend(circuit.children(node))
+        for node in sorted(reachable):
+            kind = circuit.kind(node)
+            if kind == Circuit.LITERAL:
+                memo[node] = self.__circuit.add_literal(circuit.literal(node))
+            else:
+                children = [memo[child] for child in circuit.children(node)]
+                if kind == Circuit.AND:
+                    memo[node] = self.__circuit.add_and(children)
+                else:
+                    memo[node] = self.__circuit.add_or(children, circuit.literal(node))
+        self.statistics['reused_nodes'] += len(reachable)
+        return memo[root]
+
+    def __forget_old_circuits(self):
+        for key in [key for key in self.__cache if self.__cache[key][0] is not self.__circuit]:
+            self.__cache_used -= self.__cache.pop(key)[2]
+
+    def __store(self, key, node, size):
+        self.__cache[key] = (self.__circuit, node, size)
+        self.__cache_used += size
+        while self.__cache_used > self.__cache_size and len(self.__cache) > 1:
+            (_, (_, _, evicted)) = self.__cache.popitem(last=False)
+            self.__cache_used -= evicted
+
+class CircuitError(Exception):
+    def __init__(self,msg):
+        self.__msg = msg
+
+    def __str__(self):
+        return 'error while reading circuit: ' + self.__msg
+
+def cnf_digest(cnf):
+    """Returns a digest of the clauses and the number of variables of a CNF, which does
+    not depend on the order of the clauses or of the literals in them."""
+    return clauses_digest(sorted(set([tuple(sorted(clause)) for clause in cnf.clauses()])), cnf.nr_variables())
+
+def clauses_digest(clauses, nr_variables):
+    # Every clause ends in a 0, as in DIMACS, so that the clauses can not run together.
+    digest = hashlib.sha256(b'p cnf ' + str(nr_variables).encode() + b'\0')
+    for clause in clauses:
+        digest.update(array('i', clause + (0,)).tobytes())
+    return digest.hexdigest()
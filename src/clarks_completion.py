@@ -1,63 +1,102 @@
-from utils import KeyIndexDict
-from logic import Leaf, Disjunction, Literal, CNF
-from weights import Weights
+from utils import KeyIndexDict, trampoline
+from logic import Leaf, Disjunction, Literal, CNF, CompactCNF
+from weights import VariableWeights, MISSING
 
 class ClarksCompletion(object):
-    def __call__(self,logic_program,weights,literals):
+    def __init__(self, compact=False, translation=None):
+        self.__compact = compact
+        self.__initial_translation = translation
+
+    def __call__(self,logic_program,weights,literals,constraints=()):
         self.__logic_program = logic_program
         self.__weights = weights
-        self.__new_weights = Weights()
-        self.__translation = KeyIndexDict()
-        self.__done = []
+        self.__positive = []
+        self.__negative = []
+        # A given translation keeps the variable numbers of an earlier completion.
+        if self.__initial_translation is None:
+            self.__translation = KeyIndexDict()
+        else:
+            self.__translation = self.__initial_translation
+        self.__done = set([])
+        self.__indices = {}
         self.__leafs = {}
-        self.__completion = CNF()
+        if self.__compact:
+            self.__completion = CompactCNF()
+        else:
+            self.__completion = CNF()
         for lit in literals:
             self.__get_completion(lit)
-        return self.__completion, self.__translation, self.__new_weights
-            
+        for constraint in constraints:
+            for lit in constraint:
+                self.__get_completion(lit)
+            self.__add_clause([self.__get_index(lit) for lit in constraint])
+        return self.__completion, self.__translation, VariableWeights(self.__positive, self.__negative)
+
     def __get_completion(self,lit):
         if not lit.truth_value:
             lit = -lit
         if not lit in self.__done:
-            self.__done.append(lit)
-            rules = self.__logic_program[lit]
-            if len(rules) == 0:
-                pass
-            elif len(rules) == 1:
-                big_clause = Disjunction([self.__get_leaf(lit)],[self.__completion])
-                for atom in rules[0]:
-                    self.__get_completion(atom)
-                    big_clause.add_child(self.__get_leaf(-atom))
-                    Disjunction([self.__get_leaf(-lit),self.__get_leaf(atom)],[self.__completion])
-            else:
-                big_disjunction = Disjunction([self.__get_leaf(-lit)],[self.__completion])
-                for i in range(0,len(rules)):
-                    new_lit = Literal(lit.atom + '_' + str(i),True)
-                    big_disjunction.add_child(self.__get_leaf(new_lit))
-                    Disjunction([self.__get_leaf(lit),self.__get_leaf(-new_lit)],[self.__completion])
-                    big_conjunction = Disjunction([self.__get_leaf(new_lit)],[self.__completion])
-                    for rule_lit in rules[i]:
-                        self.__get_completion(rule_lit)
-                        big_conjunction.add_child(self.__get_leaf(-rule_lit))
-                        Disjunction([self.__get_leaf(-new_lit),self.__get_leaf(rule_lit)],[self.__completion])
-                        
-    def __get_leaf(self,lit):
-        if not lit in self.__leafs:
+            trampoline(self.__complete(lit))
+
+    def __complete(self,lit):
+        self.__done.add(lit)
+        rules = self.__logic_program[lit]
+        if len(rules) == 0:
+            pass
+        elif len(rules) == 1:
+            big_clause = [self.__get_index(lit)]
+            for atom in rules[0]:
+                if self.__needs_completion(atom):
+                    yield self.__complete(abs(atom))
+                big_clause.append(self.__get_index(-atom))
+                self.__add_clause([self.__get_index(-lit),self.__get_index(atom)])
+            self.__add_clause(big_clause)
+        else:
+            big_disjunction = [self.__get_index(-lit)]
+            for i in range(0,len(rules)):
+                new_lit = Literal(lit.atom + '_rule' + str(i),True)
+                big_disjunction.append(self.__get_index(new_lit))
+                self.__add_clause([self.__get_index(lit),self.__get_index(-new_lit)])
+                big_conjunction = [self.__get_index(new_lit)]
+                for rule_lit in rules[i]:
+                    if self.__needs_completion(rule_lit):
+                        yield self.__complete(abs(rule_lit))
+                    big_conjunction.append(self.__get_index(-rule_lit))
+                    self.__add_clause([self.__get_index(-new_lit),self.__get_index(rule_lit)])
+                self.__add_clause(big_conjunction)
+            self.__add_clause(big_disjunction)
+
+    def __needs_completion(self,lit):
+        return abs(lit) not in self.__done
+
+    def __add_clause(self,indices):
+        if self.__compact:
+            self.__completion.add_clause(indices)
+        else:
+            Disjunction([self.__get_leaf(index) for index in indices],[self.__completion])
+
+    def __get_leaf(self,index):
+        if not index in self.__leafs:
+            self.__leafs[index] = Leaf(Literal(abs(index),index > 0),[])
+        return self.__leafs[index]
+
+    def __get_index(self,lit):
+        if not lit in self.__indices:
             if lit.truth_value:
-                if lit in self.__translation:
-                    index = Literal(self.__translation[lit],True)
-                else:
-                    index =  Literal(self.__translation.add(lit),True)
+                index = self.__translation.add(lit)
             else:
-                if lit in self.__translation:
-                    index = Literal(self.__translation[-lit],False)
-                else:
-                    index =  Literal(self.__translation.add(-lit),False)
-            self.__leafs[lit] = Leaf(index,[])
+                index = -self.__translation.add(-lit)
+            self.__indices[lit] = index
             if lit in self.__weights:
-                self.__new_weights[index] = self.__weights[lit]
-                self.__new_weights[-index] = self.__weights[-lit]
+                weights = (self.__weights[lit], self.__weights[-lit])
             else:
-                self.__new_weights[index] = 1
-                self.__new_weights[-index] = 1
-        return self.__leafs[lit]
\ No newline at end of file
+                weights = (1.0, 1.0)
+            if index < 0:
+                weights = weights[::-1]
+            # With a given translation, the variables of other completions get no weight.
+            variable = abs(index)
+            if variable > len(self.__positive):
+                self.__positive.extend([MISSING] * (variable - len(self.__positive)))
+                self.__negative.extend([MISSING] * (variable - len(self.__negative)))
+            (self.__positive[variable-1], self.__negative[variable-1]) = weights
+        return self.__indices[lit]
@@ -0,0 +1,147 @@
+import multiprocessing, os
+from logic import CompactCNF, DimacsWriter
+from weights import VariableWeights
+from wmc import WeightedModelCounter, CountingError, cnf_index, cnf_evidence, conditional_probabilities, components
+
+class ComponentSplitter(object):
+    """Splits a CNF into components that share no variables.
+
+    The components are the connected components of the graph of variables and clauses,
+    found with union-find. Every component is a CNF of its own, with its variables
+    renumbered from 1 and with their weights. Variables that are in no clause go into
+    one more component, with a tautology for each of them, as the simplifier does for
+    frozen atoms. The weighted model count of the CNF is the product of the counts of
+    its components. The largest components come first."""
+
+    def __call__(self, cnf, weights):
+        (positive, negative) = weights.for_variables(cnf.nr_variables(), 1.0)
+        groups = components([tuple(clause) for clause in cnf.clauses()])
+        used = set([])
+        result = []
+        for clauses in sorted(groups, key=len, reverse=True):
+            variables = sorted(set([abs(lit) for clause in clauses for lit in clause]))
+            used.update(variables)
+            result.append(make_component(clauses, variables, positive, negative))
+        free = [variable for variable in range(1,cnf.nr_variables()+1) if not variable in used]
+        if free:
+            result.append(make_component([[variable, -variable] for variable in free], free, positive, negative))
+        self.statistics = {'components' : len(result), 'free' : len(free), 'largest' : max([len(component.variables) for component in result] or [0])}
+        return result
+
+class Component(object):
+    """A part of a CNF that shares no variables with the other parts.
+
+    Variable v of the component is variable variables[v-1] of the CNF it was split from."""
+
+    def __init__(self, cnf, weights, variables):
+        self.cnf = cnf
+        self.weights = weights
+        self.variables = variables
+
+    def write(self, filename, weights_filename):
+        """Writes the clauses in DIMACS and the weights in the format of Weights.readFromFile."""
+        with open(filename,'w') as out:
+            DimacsWriter()(self.cnf, out)
+        (positive, negative) = self.weights.for_variables(self.cnf.nr_variables())
+        with open(weights_filename,'w') as out:
+            out.writelines(str(var) + ' ' + str(positive[var-1]) + ' ' + str(negative[var-1]) + '\n' for var in range(1,self.cnf.nr_variables()+1))
+
+class ComponentCounter(object):
+    """Counts the components of a CNF separately and multiplies their counts.
+
+    Has the interface of WeightedModelCounter. Every query and evidence literal goes to
+    the component of its variable. With workers, the components are counted in a pool
+    of processes, which get the components pickled, so the CNF is not shared."""
+
+    def __init__(self, components, workers=1):
+        self.__components = components
+        self.__workers = workers
+        self.__location = {}
+        for (i, component) in enumerate(components):
+            for (local, variable) in enumerate(component.variables, 1):
+                self.__location[variable] = (i, local)
+        self.statistics = {'components' : len(components)}
+
+    def count(self, assumptions=()):
+        """Returns the weighted model count of the CNF conjoined with the given literals."""
+        result = 1.0
+        for (total, _) in self.__count(assumptions, []):
+            result *= total
+        return result
+
+    def probabilities(self, queries, evidence, translation):
+        """Returns P(query | evidence) for every query literal.
+
+        Components without evidence on them only add to the normalization, and their
+        counts cancel out, but they are still counted, so a CNF without models is reported."""
+        assumptions = cnf_evidence(evidence, translation)
+        indices = [index for index in [cnf_index(query, translation) for query in queries] if index is not None]
+        normalization = 1.0
+        ratios = {}
+        for (total, counts) in self.__count(assumptions, indices):
+            normalization *= total
+            for index in counts:
+                ratios[index] = counts[index] / total if total else 0.0
+        if normalization == 0:
+            raise CountingError('the evidence has probability zero')
+        return conditional_probabilities(queries, translation, 1.0, lambda index : ratios[index])
+
+    def __count(self, assumptions, indices):
+        # Returns the count of every component under the assumptions, together with its
+        # counts with each of the indices in it, by index of the CNF.
+        tasks = [(component.cnf, component.weights, [], []) for component in self.__components]
+        originals = [[] for component in self.__components]
+        for lit in assumptions:
+            (i, local) = self.__local(lit)
+            tasks[i][2].append(local)
+        for lit in indices:
+            (i, local) = self.__local(lit)
+            tasks[i][3].append(local)
+            originals[i].append(lit)
+        if self.__workers > 1 and len(tasks) > 1:
+            with multiprocessing.get_context('spawn').Pool(self.__workers) as pool:
+                results = pool.map(count_component, tasks, 1)
+        else:
+            results = list(map(count_component, tasks))
+        for (_, _, statistics) in results:
+            for key in statistics:
+                self.statistics[key] = self.statistics.get(key, 0) + statistics[key]
+        return [(total, dict(zip(original, counts))) for ((total, counts, _), original) in zip(results, originals)]
+
+    def __local(self, lit):
+        if not abs(lit) in self.__location:
+            raise CountingError('literal outside the CNF: ' + str(lit))
+        (i, local) = self.__location[abs(lit)]
+        return (i, local if lit > 0 else -local)
+
+def make_component(clauses, variables, positive, negative):
+    """Makes a Component of clauses over the given sorted variables, with the weights of
+    the variables of the whole CNF in positive and negative, variable v at v-1."""
+    numbering = dict((variable, i) for (i, variable) in enumerate(variables, 1))
+    renumber = lambda lit : numbering[lit] if lit > 0 else -numbering[-lit]
+    cnf = CompactCNF()
+    for clause in clauses:
+        cnf.add_clause([renumber(lit) for lit in clause])
+    weights = VariableWeights([positive[variable-1] for variable in variables], [negative[variable-1] for variable in variables])
+    return Component(cnf, weights, variables)
+
+def count_component(task):
+    """Counts a component under assumptions, and also together with each of the given
+    literals. Runs in the workers of ComponentCounter."""
+    (cnf, weights, assumptions, indices) = task
+    counter = WeightedModelCounter(cnf, weights)
+    total = counter.count(assumptions)
+    counts = [counter.count(assumptions + [index]) if total else 0.0 for index in indices]
+    return (total, counts, counter.statistics)
+
+def write_components(components, directory):
+    """Writes every component to componentN.cnf and componentN.weights in directory,
+    numbered from 1, and returns the names of the DIMACS files."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    filenames = []
+    for (i, component) in enumerate(components, 1):
+        filename = os.path.join(directory, 'component' + str(i) + '.cnf')
+        component.write(filename, os.path.join(directory, 'component' + str(i) + '.weights'))
+        filenames.append(filename)
+    return filenames
@@ -1,17 +1,33 @@
-import os,subprocess
+import io,os,re,subprocess,multiprocessing,threading
 from utils import Timer, Logger
 from logic import Literal, LogicProgram
 from weights import Weights
 
 class Grounder(object):
+    def __init__(self, cache=None, command=('yap','-q','-l','grounder.pl'), backend='auto', encoding='pairwise', workers=1, streaming=False):
+        self.__cache = cache
+        self.__command = list(command)
+        self.__backend = backend
+        self.__encoding = encoding
+        self.__workers = workers
+        self.__streaming = streaming
+        
     def __call__(self, infiles, env):
-        self.__env = env
         logfile = open(env.tmp_path('grounding.log'),'w')
         logger = Logger(file = logfile,verbose = 1)
         with Timer('grounding',logger) as timer:
-            self.__convert_to_lpad(infiles)
-            self.__ground_lpad()
-            (rules, weights, constraints, queries, evidence) = self.__parse_grounding()
+            key = None
+            if self.__cache is not None:
+                grounder_files = [arg for arg in self.__command if os.path.isfile(arg)]
+                key = self.__cache.key(list(infiles) + grounder_files, self.__backend, self.__encoding, *self.__command)
+                result = self.__cache.get(key)
+                if result is not None:
+                    logger(1,'grounding cache hit:',key,msgtype = 'RESULT')
+                    return result
+            statements = list(ProbLogParser(self.__workers).statements(infiles))
+            backend = self.__get_backend(statements)
+            logger(1,'grounder backend:',type(backend).__name__,msgtype = 'RESULT')
+            (rules, weights, constraints, queries, evidence) = backend(statements, env)
             logger(1,'number defined predicates:',len(rules),msgtype = 'RESULT')
             nr_rules = 0
             for head in rules:
@@ -19,20 +35,134 @@ class Grounder(object):
             logger(1,'number rules:',nr_rules,msgtype = 'RESULT')
             logger(1,'number queries:',len(queries),msgtype = 'RESULT')
             logger(1,'number evidence atoms:',len(evidence),msgtype = 'RESULT')
+            if key:
+                self.__cache.put(key, (rules, weights, constraints, queries, evidence))
             return (rules, weights, constraints, queries, evidence)
             
-    def __convert_to_lpad(self, infiles):
-        parser = ProbLogParser()
+    def __get_backend(self, statements):
+        if self.__backend == 'yap':
+            return YapGrounder(self.__command, self.__encoding, self.__workers, self.__streaming)
+        elif self.__backend == 'python':
+            return PythonGrounder(self.__encoding)
+        elif self.__backend == 'auto':
+            for (kind, statement, _) in statements:
+                if has_variables(statement):
+                    return YapGrounder(self.__command, self.__encoding, self.__workers, self.__streaming)
+            return PythonGrounder(self.__encoding)
+        else:
+            return self.__backend
+            
+QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+VARIABLE = re.compile(r'(?<![\w.])[A-Z_]')
+
+def has_variables(statement):
+    return VARIABLE.search(QUOTED.sub('', statement)) is not None
+            
+class YapGrounder(object):
+    """Grounds a program with an external grounder, by default grounder.pl on yap.
+
+    The grounder is run as the command followed by -g and a goal, and gets the program
+    as one statement per line: rules as 'p::h<-b1,b2.', 'query(q).' and
+    'evidence(e,true).'. A non-zero exit status is an error. The goal is
+    catch(main(Program,Grounding,Queries,Evidence),_,halt(1)), which reads the program
+    from the file Program. It writes one ground rule per line to Grounding, one query
+    atom per line to Queries and '<atom> <true|false>' per line to Evidence.
+
+    Without streaming these are files, parsed once the grounder exits. In streaming
+    mode they are named pipes: the program is written and the grounding is parsed,
+    see GroundProbLogParser.parse_stream, while the grounder is still running, and no
+    data is written to disk. tests/fake_grounder.py stands in for grounder.pl on
+    programs that are already ground."""
+    
+    def __init__(self, command=('yap','-q','-l','grounder.pl'), encoding='pairwise', workers=1, streaming=False):
+        self.__command = list(command)
+        self.__encoding = encoding
+        self.__workers = workers
+        self.__streaming = streaming
+        
+    def __call__(self, statements, env):
+        self.__env = env
+        if self.__streaming:
+            return self.__stream(statements)
+        self.__convert_to_lpad(statements)
+        self.__ground_lpad()
+        return self.__parse_grounding()
+        
+    def __stream(self, statements):
+        paths = [self.__lpad_path(), self.__ground_lpad_path(), self.__queries_path(), self.__evidence_path()]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+            os.mkfifo(path)
+        # The outputs are opened at both ends here, without blocking, and the ends of
+        # the grounder are only closed once it has exited. So it can open them in any
+        # order, and reading them ends even if it never opens some of them.
+        outputs = [os.fdopen(open_fifo(path, os.O_RDONLY)) for path in paths[1:]]
+        placeholders = [open_fifo(path, os.O_WRONLY) for path in paths[1:]]
+        # The program is written, and the queries and evidence are read, from threads,
+        # so that no pipe can fill up while the grounding is parsed.
+        (queries, evidence) = ([], [])
+        writer = threading.Thread(target=self.__write_program, args=(statements, paths[0]))
+        readers = [threading.Thread(target=lambda : queries.extend(outputs[1])),
+                   threading.Thread(target=lambda : evidence.extend(outputs[2]))]
+        command = self.__command + ['-g',self.__main_goal()]
+        process = subprocess.Popen(command)
+        threads = [writer] + readers + [threading.Thread(target=release_after_exit, args=(process, placeholders, writer, paths[0]))]
+        for thread in threads:
+            thread.start()
+        try:
+            lines = self.__tagged_lines(outputs[0], queries, evidence, readers)
+            result = GroundProbLogParser(self.__encoding, self.__workers).parse_stream(lines)
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+            for output in outputs:
+                output.close()
+            for path in paths:
+                os.remove(path)
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+        return result
+        
+    def __tagged_lines(self, grounding, queries, evidence, readers):
+        for line in grounding:
+            yield 'rule ' + line
+        for reader in readers:
+            reader.join()
+        for line in queries:
+            yield 'query ' + line
+        for line in evidence:
+            yield 'evidence ' + line
+        
+    def __write_program(self, statements, path):
+        # Opening the pipe waits for the grounder to open it, so that it sees the end of
+        # the program only after it has read all of it.
+        try:
+            with open(path,'w') as out:
+                for (kind, statement, _) in statements:
+                    out.write(statement + '\n')
+        except BrokenPipeError:
+            # The grounder stopped early; its exit status reports why.
+            pass
+            
+    def __convert_to_lpad(self, statements):
         if os.path.exists(self.__lpad_path()):
             os.remove(self.__lpad_path())
-        parser(infiles,self.__lpad_path())
+        with open(self.__lpad_path(),'w') as out:
+            for (kind, statement, _) in statements:
+                out.write(statement + '\n')
     
     def __ground_lpad(self):
-        main_pred = "catch(main('" + self.__lpad_path() + "','" + self.__ground_lpad_path() + "','" + self.__queries_path() + "','" + self.__evidence_path() + "'),_,halt(1))."
-        subprocess.check_call(['yap','-q','-l','grounder.pl','-g',main_pred])
+        subprocess.check_call(self.__command + ['-g',self.__main_goal()])
+        
+    def __main_goal(self):
+        return "catch(main('" + self.__lpad_path() + "','" + self.__ground_lpad_path() + "','" + self.__queries_path() + "','" + self.__evidence_path() + "'),_,halt(1))."
         
     def __parse_grounding(self):
-        parser = GroundProbLogParser()
+        parser = GroundProbLogParser(self.__encoding, self.__workers)
         (rules, weights, constraints,queries, evidence) = parser(self.__ground_lpad_path(), self.__queries_path(), self.__evidence_path())
         return (rules, weights, constraints, queries, evidence)
         
@@ -47,29 +177,108 @@ class Grounder(object):
     
     def __evidence_path(self):
         return self.__env.tmp_path('evidence')
+        
+def open_fifo(path, flags):
+    """Opens a named pipe without waiting for its other end, and returns a blocking descriptor."""
+    descriptor = os.open(path, flags | os.O_NONBLOCK)
+    os.set_blocking(descriptor, True)
+    return descriptor
+    
+def release_after_exit(process, descriptors, writer, path):
+    """Closes the given ends of the output pipes once the grounder has exited, and reads
+    away the program until its writer is done, in case the grounder never read it."""
+    process.wait()
+    for descriptor in descriptors:
+        os.close(descriptor)
+    while writer.is_alive():
+        descriptor = open_fifo(path, os.O_RDONLY)
+        while os.read(descriptor, 1 << 16):
+            pass
+        os.close(descriptor)
+        writer.join(0.01)
+        
+class PythonGrounder(object):
+    def __init__(self, encoding='pairwise'):
+        self.__encoding = encoding
+        
+    def __call__(self, statements, env=None):
+        parser = GroundProbLogParser(self.__encoding)
+        parser.reset()
+        for (kind, statement, parsed) in statements:
+            if kind == 'query':
+                parser.add_query(Literal.parse(self.__arguments(statement)[0]))
+            elif kind == 'evidence':
+                arguments = self.__arguments(statement)
+                parser.add_evidence(arguments[0], arguments[1] if len(arguments) > 1 else 'true')
+            else:
+                parser.add_rule(*parsed)
+        return parser.result()
+        
+    def __arguments(self, statement):
+        arguments = statement[statement.index('(')+1:statement.rindex(')')]
+        if ',' in arguments:
+            (atom, truth) = arguments.rsplit(',',1)
+            if truth.strip() in ('true','false'):
+                return [atom.strip(), truth.strip()]
+        return [arguments.strip()]
 
 class ProbLogParser:
+    def __init__(self, workers=1):
+        self.__workers = workers
+        
     def __call__(self, infiles, outfile):
+        with open(outfile,'w') as out:
+            for (kind, statement, _) in self.statements(infiles):
+                out.write(statement + '\n')
+                
+    def statements(self, infiles):
+        if self.__workers > 1:
+            return self.__parallel_statements(infiles)
+        return self.__serial_statements(infiles)
+        
+    def __serial_statements(self, infiles):
+        for (kind, statement) in self.__read(infiles):
+            if kind == 'rule':
+                (head,body) = RuleParser()(statement)
+                yield ('rule', self.__format_rule(head,body), (head,body))
+            else:
+                yield (kind, statement, None)
+                
+    def __parallel_statements(self, infiles):
+        # The rules are parsed in the workers, but their literals are made here and in
+        # file order, so atoms are interned in the same order as in the serial path.
+        statements = list(self.__read(infiles))
+        rules = [statement for (kind, statement) in statements if kind == 'rule']
+        chunksize = max(1, len(rules) // (4 * self.__workers))
+        with multiprocessing.Pool(self.__workers) as pool:
+            records = pool.imap(parse_rule, rules, chunksize)
+            for (kind, statement) in statements:
+                if kind == 'rule':
+                    (head,body) = rule_from_record(next(records))
+                    yield ('rule', self.__format_rule(head,body), (head,body))
+                else:
+                    yield (kind, statement, None)
+                
+    def __read(self, infiles):
         self.__strings = {}
         rule = ''
-        with open(outfile,'w') as out:
-            for file in infiles:
-                for line in open(file):
-                    line = line.strip()
-                    if line.startswith(':- '):
-                        raise ParseError("lines can't start with :-. Built-in libraries are preloaded for you. Other files can be included by giving multiple input files")
-                    if not line.startswith('%'):
-                        if '%' in line:
-                            line = line.split('%')[0].strip()
-                        rule += line
-                        if line.endswith('.'):
-                            if rule.startswith('query'):
-                                out.write(self.__parse_query(rule) + '\n')
-                            elif rule.startswith('evidence'):
-                                out.write(self.__parse_evidence(rule) + '\n')
-                            else:
-                                out.write(self.__parse_rule(rule) + '\n')
-                            rule = ''
+        for file in infiles:
+            for line in open(file):
+                line = line.strip()
+                if line.startswith(':- '):
+                    raise ParseError("lines can't start with :-. Built-in libraries are preloaded for you. Other files can be included by giving multiple input files")
+                if not line.startswith('%'):
+                    if '%' in line:
+                        line = line.split('%')[0].strip()
+                    rule += line
+                    if line.endswith('.'):
+                        if rule.startswith('query'):
+                            yield ('query', self.__parse_query(rule))
+                        elif rule.startswith('evidence'):
+                            yield ('evidence', self.__parse_evidence(rule))
+                        else:
+                            yield ('rule', rule)
+                        rule = ''
     
     def __parse_query(self, query):
         return query
@@ -77,9 +286,7 @@ class ProbLogParser:
     def __parse_evidence(self, evidence):
         return evidence
     
-    def __parse_rule(self, rule):
-        p = RuleParser()
-        (head,body) = p(rule)
+    def __format_rule(self, head, body):
         result = str(head[0][0]) + '::' + head[0][1].toProlog()
         for (prob,lit) in head[1:]:
             result += ';' + prob + '::' + lit.toProlog()
@@ -93,51 +300,129 @@ class ProbLogParser:
         return result
     
 class GroundProbLogParser:
+    """Turns ground annotated disjunctions into rules on choice nodes and constraints.
+
+    The constraints say that at most one choice of a disjunction is true, and that
+    exactly one is true when its body holds. The pairwise encoding uses a clause per
+    pair of choices. The sequential and commander encodings stay linear in the number
+    of choices. Their auxiliary atoms have weight 1 and are defined by the choices, so
+    they do not change the weighted model count."""
+    
+    ENCODINGS = ('pairwise', 'sequential', 'commander')
+    COMMANDER_GROUP_SIZE = 3
+    
+    # Groundings are split into chunks of at least this many bytes for the workers, and
+    # streamed groundings into chunks of this many lines.
+    MIN_CHUNK_SIZE = 1 << 16
+    STREAM_CHUNK_SIZE = 256
+    
+    # Sums of probabilities such as 0.2+0.4+0.3+0.1 can come out a rounding error above one.
+    PROBABILITY_TOLERANCE = 1e-9
+    
+    def __init__(self, encoding='pairwise', workers=1):
+        if not encoding in self.ENCODINGS:
+            raise ParseError('unknown at-most-one encoding: ' + str(encoding))
+        self.__encoding = encoding
+        self.__workers = workers
+        
     def __call__(self, lpad, queries, evidence):
+        self.reset()
         self.__parse_queries(queries)
         self.__parse_evidence(evidence)
         self.__parse_lpad(lpad)
+        return self.result()
+        
+    def reset(self):
+        self.__weights = Weights()
+        self.__logicProgram = LogicProgram()
+        self.__constraints = []
+        self.__rule_counter = 0
+        self.__auxiliary_counter = 0
+        self.__queries = set([])
+        self.__evidence = set([])
+        
+    def result(self):
         return (self.__logicProgram, self.__constraints, self.__weights, self.__queries, self.__evidence)
+        
+    def add_query(self, query):
+        self.__queries.add(query)
+        
+    def add_evidence(self, atom, truth):
+        if truth == 'true':
+            self.__evidence.add(Literal(atom,True))
+        elif truth == 'false':
+            self.__evidence.add(Literal(atom,False))
+        else:
+            raise ParseError('The truth value for evidence: ' + atom + ' should be true/false')
+        
+    def add_rule(self, head, body):
+        head = self.__calculate_probabilities(head)
+        choices = self.__get_choices(head)
+        self.__make_rules(choices, body)
+        self.__make_constraints(choices, body)
+            
+    def parse_stream(self, lines):
+        """Parses a grounding from an iterable of tagged lines, e.g. a pipe.
+        
+        A line is 'query <atom>', 'evidence <atom> <true|false>' or 'rule <ground rule>'.
+        Every line is added as soon as it is read. With workers, the rules are parsed in
+        the workers while the lines are still coming in."""
+        self.reset()
+        if self.__workers > 1:
+            # Forked workers would inherit the pipes of the grounder and keep its stdin
+            # open, so it never sees the end of its input.
+            with multiprocessing.get_context('spawn').Pool(self.__workers) as pool:
+                for record in pool.imap(parse_tagged_line, lines, self.STREAM_CHUNK_SIZE):
+                    self.__add_tagged_record(record)
+        else:
+            for line in lines:
+                self.__add_tagged_record(parse_tagged_line(line))
+        return self.result()
+        
+    def __add_tagged_record(self, record):
+        (tag, value) = record
+        if tag == 'query':
+            self.add_query(Literal.parse(value))
+        elif tag == 'evidence':
+            self.add_evidence(*value)
+        elif tag == 'rule':
+            self.add_rule(*rule_from_record(value))
             
     def __parse_queries(self, queries):
-        self.__queries = set([])
         for line in open(queries):
-            self.__queries.add(Literal.parse(line.strip()))
+            self.add_query(Literal.parse(line.strip()))
             
     def __parse_evidence(self, evidence):
-        self.__evidence = set([])
         for line in open(evidence):
-            atom = line.split()[0]
-            truth = line.split()[1]
-            if truth == 'true':
-                self.__evidence.add(Literal(atom,True))
-            elif truth == 'false':
-                self.__evidence.add(Literal(atom,False))
-            else:
-                raise ParseError('The truth value for evidence: ' + atom + ' should be true/false')
+            self.add_evidence(line.split()[0], line.split()[1])
         
     def __parse_lpad(self, lpad):
-        self.__weights = Weights()
-        self.__logicProgram = LogicProgram()
-        self.__constraints = []
-        self.__rule_counter = 0
+        if self.__workers > 1:
+            self.__parse_lpad_parallel(lpad)
+            return
         for line in open(lpad):
             line = line.strip()
             self.__parse_AD(line)
+            
+    def __parse_lpad_parallel(self, lpad):
+        # Chunks come back in file order and are added one rule at a time, as in the
+        # serial path, so the rules, choice nodes and constraints are numbered the same.
+        nr_chunks = max(1, min(4 * self.__workers, os.path.getsize(lpad) // self.MIN_CHUNK_SIZE))
+        with multiprocessing.Pool(self.__workers) as pool:
+            for records in pool.imap(parse_lines, line_chunks(lpad, nr_chunks)):
+                for record in records:
+                    self.add_rule(*rule_from_record(record))
                 
     def __parse_AD(self,ad):
         p = RuleParser()
         (head,body) = p(ad)
-        head = self.__calculate_probabilities(head)
-        choices = self.__get_choices(head)
-        self.__make_rules(choices, body)
-        self.__make_constraints(choices, body)
+        self.add_rule(head, body)
             
     def __calculate_probabilities(self,head):
         new_head = []
         for (prob,atom) in head:
             if '/' in prob:
-                parts = prob,atom.split('/')
+                parts = prob.split('/')
                 new_head.append((float(parts[0])/float(parts[1]),atom))
             else:
                 new_head.append((float(prob),atom))
@@ -156,10 +441,11 @@ class GroundProbLogParser:
             self.__weights[choice] = prob
             self.__weights[-choice] = 1.0
             result.append((atom,choice))
-        if total_prob > 1:
-            raise ParseError('the total probability of a rule is bigger than one: ' + head)
+        # The sum is checked here, per rule, since it also gives the weight of the nil choice.
+        if total_prob > 1 + self.PROBABILITY_TOLERANCE:
+            raise ParseError('the total probability of a rule is bigger than one: ' + ';'.join(str(prob) + '::' + str(atom) for (prob,atom) in head))
         nillChoice = Literal('choice_node_' + str(self.__rule_counter) + '_' + str(len(head)),True)
-        self.__weights[nillChoice] = round(1-total_prob)
+        self.__weights[nillChoice] = max(0.0, 1-total_prob)
         self.__weights[-nillChoice] = 1.0
         result.append((None,nillChoice))
         self.__rule_counter += 1
@@ -174,6 +460,9 @@ class GroundProbLogParser:
                 self.__logicProgram.add_rule(head, body_copy)
             
     def __make_constraints(self,choices,body):
+        if self.__encoding != 'pairwise':
+            self.__make_linear_constraints([choice for (_,choice) in choices], body)
+            return
         if len(choices) > 1:
             for i in range(0,len(choices)- 1):
                 for j in range(i+1,len(choices)):
@@ -187,87 +476,181 @@ class GroundProbLogParser:
                 for (_,choice) in choices:
                     self.__constraints.append([-choice,atom])
             self.__constraints.append(constraint)
+            
+    def __make_linear_constraints(self,choices,body):
+        # some is true exactly when one of the choices is, and it stands in for all of
+        # them in the clauses that link the choices to the body.
+        if self.__encoding == 'sequential':
+            some = self.__sequential(choices)
+        else:
+            some = self.__commander(choices)
+        for atom in body:
+            self.__constraints.append([-some,atom])
+        self.__constraints.append([some] + [-atom for atom in body])
+        
+    def __sequential(self,choices):
+        # prefix is true when one of the choices up to the current one is.
+        prefix = choices[0]
+        for choice in choices[1:]:
+            new_prefix = self.__auxiliary()
+            self.__constraints.append([-prefix,-choice])
+            self.__constraints.append([-prefix,new_prefix])
+            self.__constraints.append([-choice,new_prefix])
+            self.__constraints.append([-new_prefix,prefix,choice])
+            prefix = new_prefix
+        return prefix
+        
+    def __commander(self,choices):
+        # Every group gets a commander that is true when one of its members is. At most
+        # one member per group and at most one commander may be true.
+        while len(choices) > self.COMMANDER_GROUP_SIZE:
+            commanders = []
+            for i in range(0,len(choices),self.COMMANDER_GROUP_SIZE):
+                group = choices[i:i+self.COMMANDER_GROUP_SIZE]
+                if len(group) == 1:
+                    commanders.append(group[0])
+                else:
+                    commanders.append(self.__disjunction(group))
+            choices = commanders
+        if len(choices) == 1:
+            return choices[0]
+        return self.__disjunction(choices)
+        
+    def __disjunction(self,group):
+        for i in range(0,len(group)-1):
+            for j in range(i+1,len(group)):
+                self.__constraints.append([-group[i],-group[j]])
+        commander = self.__auxiliary()
+        for lit in group:
+            self.__constraints.append([-lit,commander])
+        self.__constraints.append([-commander] + group)
+        return commander
+        
+    def __auxiliary(self):
+        lit = Literal('choice_aux_' + str(self.__auxiliary_counter),True)
+        self.__auxiliary_counter += 1
+        self.__weights[lit] = 1.0
+        self.__weights[-lit] = 1.0
+        return lit
+    
+def parse_rule(rule):
+    """Parses a rule into a record of strings, which is cheaper to send between processes than literals."""
+    (head,body) = RuleParser()(rule)
+    return ([(prob,lit.atom) for (prob,lit) in head], [(lit.atom,lit.truth_value) for lit in body])
+    
+def rule_from_record(record):
+    (head,body) = record
+    return ([(prob,Literal(atom,True)) for (prob,atom) in head], [Literal(atom,truth_value) for (atom,truth_value) in body])
+    
+def parse_tagged_line(line):
+    """Parses a line of a streamed grounding into a record of strings, as parse_rule does."""
+    line = line.strip()
+    if not line:
+        return (None, None)
+    (tag, _, value) = line.partition(' ')
+    value = value.strip()
+    if tag == 'query':
+        return (tag, value)
+    elif tag == 'evidence':
+        parts = value.rsplit(None,1)
+        if len(parts) != 2:
+            raise ParseError('evidence without a truth value in the grounding: ' + line)
+        return (tag, tuple(parts))
+    elif tag == 'rule':
+        return (tag, parse_rule(value))
+    raise ParseError('unknown statement in the grounding: ' + line)
+    
+def parse_lines(chunk):
+    """Parses the rules on the lines between two byte offsets of a grounding."""
+    (filename, start, end) = chunk
+    with open(filename,'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return [parse_rule(line.strip()) for line in io.TextIOWrapper(io.BytesIO(data))]
+    
+def line_chunks(filename, nr_chunks):
+    """Splits a file into at most nr_chunks (filename, start, end) byte ranges that end at line breaks."""
+    size = os.path.getsize(filename)
+    offsets = [0]
+    with open(filename,'rb') as file:
+        for i in range(1,nr_chunks):
+            file.seek(max(size * i // nr_chunks, offsets[-1]))
+            file.readline()
+            offsets.append(min(file.tell(), size))
+    offsets.append(size)
+    return [(filename, offsets[i], offsets[i+1]) for i in range(0,len(offsets)-1) if offsets[i+1] > offsets[i]]
     
 class RuleParser:
+    """Parses a rule into its head and body in one scan.
+
+    The scan only stops at quoted strings, brackets and the separators :-, <-, ::,
+    ; and ,. Separators inside quotes or brackets belong to the atom around them.
+    Every atom is cut out of the rule once, when the separators around it are known."""
+    
+    TOKEN = re.compile(r"""'[^']*'|"[^"]*"|[()\[\]{}'";,]|:-|<-|::""")
+    SEPARATORS = frozenset([':-', '<-', '::', ';', ','])
+    
     def __call__(self, rule):
-        (head, body) = self.__split_head_body(rule[:-1])
-        head = self.__parse_head(head)
-        body = self.__parse_body(body)
-        return (head,body)
+        rule = rule[:-1]
+        arrow = None
+        separators = []
+        depth = 0
+        for match in self.TOKEN.finditer(rule):
+            token = match.group()
+            if token in '([{':
+                depth += 1
+            elif token in ')]}':
+                depth -= 1
+            elif token == "'":
+                # Quoted strings are single tokens, so a lone quote is never closed.
+                raise ParseError('single quotes not closed: ' + rule)
+            elif token == '"':
+                raise ParseError('double quoted not closed: ' + rule)
+            elif depth == 0 and token in self.SEPARATORS:
+                if token == ':-' or token == '<-':
+                    if arrow is not None:
+                        raise ParseError('more than one :- in rule: ' + rule)
+                    arrow = match.start()
+                else:
+                    separators.append((match.start(), token))
+        if depth:
+            raise ParseError('wrong brackets: ' + rule)
+        if arrow is None:
+            return (self.__parse_head(rule, separators, len(rule)), [])
+        head = [(position, token) for (position, token) in separators if position < arrow]
+        body = [(position, token) for (position, token) in separators if position > arrow and token != '::']
+        return (self.__parse_head(rule, head, arrow), self.__parse_body(rule, body, arrow + 2))
         
-    def __split_head_body(self, rule):
-        parts = self.__split(rule,':-','<-')
-        if len(parts) == 1:
-            return (parts[0],'true')
-        elif len(parts) == 2:
-            return (parts[0],parts[1])
-        else:
-            raise ParseError('more than one :- in rule: ' + rule)
-        
-    def __parse_head(self, head):
-        if len(self.__split(head, ',')) > 1:
-            raise ParseError("heads of rules can't contain conjunction: '" + head)
-        atoms = self.__split(head,';')
+    def __parse_head(self, rule, separators, end):
         result = []
-        for atom in atoms:
-            parts = self.__split(atom,'::')
-            if len(parts) == 1:
-                prob = '1.0'
-                pred = Literal.parse(atom)
-            elif len(parts) == 2:
-                prob = parts[0]
-                pred = Literal.parse(parts[1])
+        start = 0
+        probability = None
+        for (position, token) in separators + [(end, ';')]:
+            if token == ',':
+                raise ParseError("heads of rules can't contain conjunction: '" + rule[:end])
+            elif token == '::':
+                if probability is not None:
+                    raise ParseError('more than one :: in head: ' + rule[:end])
+                probability = rule[start:position].strip()
+                start = position + 2
             else:
-                raise ParseError('more than one :: in head: ' + head)
-            if not pred.truth_value:
-                raise ParseError('no negation in the head of rules supported: ' + head)
-            result.append((prob,pred))
+                pred = Literal.parse(rule[start:position].strip())
+                if not pred.truth_value:
+                    raise ParseError('no negation in the head of rules supported: ' + rule[:end])
+                result.append((probability or '1.0', pred))
+                start = position + 1
+                probability = None
         return result
     
-    def __parse_body(self,body):
-        if len(self.__split(body,';')) > 1:
-            raise ParseError("bodies of rules can't contain disjunctions: '" + body)
+    def __parse_body(self, rule, separators, start):
         result = []
-        for atom in self.__split(body,','):
-            if atom != 'true':
+        for (position, token) in separators + [(len(rule), ',')]:
+            if token == ';':
+                raise ParseError("bodies of rules can't contain disjunctions: '" + rule[start:])
+            atom = rule[start:position].strip()
+            if token == ',' and atom != 'true':
                 result.append(Literal.parse(atom))
-        return result
-    
-    def __split(self,string,*separators):
-        parts = [string]
-        for separator in separators:
-            new_parts = []
-            for part in parts:
-                new_parts.extend(part.split(separator))
-            parts = new_parts
-        singleQuoted = False
-        doubleQuoted = False
-        bracketCount = 0
-        result = ['']
-        for part in parts:
-            for char in part:
-                if char == "'":
-                    if not doubleQuoted:
-                        singleQuoted = not singleQuoted
-                elif char == '"':
-                    if not singleQuoted:
-                        doubleQuoted = not doubleQuoted
-                elif char == '(':
-                    bracketCount += 1
-                elif char == ')':
-                    bracketCount -= 1
-            result[-1] += part
-            if not singleQuoted and not doubleQuoted and not bracketCount:
-                result.append('')
-            else:
-                result[-1] += separator[0]
-        del result[-1]
-        if singleQuoted:
-            raise ParseError('single quotes not closed: ' + string)
-        if doubleQuoted:
-            raise ParseError('double quoted not closed: ' + string)
-        if bracketCount:
-            raise ParseError('wrong brackets: ' + string)
+            start = position + len(token)
         return result
             
         
@@ -1,6 +1,47 @@
+from array import array
+import io, re, threading
+import utils
+
+class AtomTable(object) :
+    def __init__(self) :
+        self.__names = []
+        self.__ids = {}
+        self.__lock = threading.Lock()
+        
+    def intern(self, atom) :
+        name = str(atom)
+        index = self.__ids.get(name)
+        if index is None :
+            with self.__lock :
+                index = self.__ids.get(name)
+                if index is None :
+                    self.__names.append(name)
+                    index = len(self.__names)
+                    self.__ids[name] = index
+        return index
+        
+    def name(self, index) :
+        if index <= 0 :
+            raise IndexError
+        return self.__names[index-1]
+        
+    def __contains__(self, atom) :
+        return str(atom) in self.__ids
+        
+    def __len__(self) :
+        return len(self.__names)
+        
+atoms = AtomTable()
+        
 class Literal(object) :
+    __slots__ = ('atom', 'truth_value', 'index')
+    
     def __init__(self, atom, truth_value) :
         self.atom, self.truth_value = atom, truth_value
+        if truth_value :
+            self.index = atoms.intern(atom)
+        else :
+            self.index = -atoms.intern(atom)
         
     def __str__(self) :
         if self.truth_value :
@@ -18,16 +59,29 @@ class Literal(object) :
         return str(self)
             
     def __eq__(self, other) :
-        return str(self) == str(other)
+        if isinstance(other, Literal) :
+            return self.index == other.index
+        return NotImplemented
         
     def __hash__(self) :
-        return hash(str(self))
+        return self.index
         
     def __lt__(self, other) :
         return str(self) < str(other)
         
     def __neg__(self) :
-        return Literal(self.atom, not self.truth_value)
+        result = Literal.__new__(Literal)
+        result.atom, result.truth_value, result.index = self.atom, not self.truth_value, -self.index
+        return result
+        
+    def __abs__(self) :
+        if self.truth_value :
+            return self
+        else :
+            return -self
+        
+    def __reduce__(self) :
+        return (Literal, (self.atom, self.truth_value))
         
     @classmethod
     def parse(cls, string) :
@@ -45,24 +99,39 @@ class Literal(object) :
 class LogicProgram(object):
     def __init__(self):
         self.__rules = {}
+        self.__index = {}
+        self.__facts = set([])
     
     def add_rule(self, head, body):
-        bodies = self[head]
+        if self.is_fact(head):
+            return
         new_body = set([])
         for lit in body:
-            if self[lit] != [[]]:
+            if not self.is_fact(lit):
                 new_body.add(lit)
         if new_body:
-            bodies.append(new_body)
-            self.__rules[head] = bodies
+            self.__rules.setdefault(head,[]).append(new_body)
+            for lit in new_body:
+                self.__index.setdefault(lit,[]).append((head,new_body))
         else:
-            self.__rules[head] = [[]]
-            for head in self.__rules:
-                for body in self.__rules[head]:
-                    if head in body:
-                        body.remove(head)
-                if [] in self.__rules[head]:
-                    self.__rules[head] = [[]]
+            self.__add_fact(head)
+            
+    def __add_fact(self, fact):
+        queue = [fact]
+        while queue:
+            fact = queue.pop()
+            if self.is_fact(fact):
+                continue
+            self.__rules[fact] = [[]]
+            self.__facts.add(fact)
+            for (head, body) in self.__index.pop(fact,[]):
+                if not self.is_fact(head):
+                    body.discard(fact)
+                    if not body:
+                        queue.append(head)
+                        
+    def is_fact(self, lit):
+        return lit in self.__facts
      
     def __getitem__(self,key):
         return self.__rules.get(key,[])
@@ -216,13 +285,14 @@ class CNF(Conjunction):
                 raise LogicException("The children of the disjunction can only contain leafs")
         super(CNF, self).add_child
     
-    def toDimacs(self):
-        result = 'p cnf ' + str(len(list(self.variables()))) + ' ' + str(len(list(self.children()))) + '\n'
+    def toDimacs(self, weights=None, weights_format='problog'):
+        out = io.StringIO()
+        DimacsWriter(weights_format)(self, out, weights)
+        return out.getvalue()
+        
+    def clauses(self):
         for child in self.children():
-            for grandchild in child.children():
-                result += str(grandchild) + ' '
-            result += '0\n'
-        return result
+            yield [int(str(grandchild)) for grandchild in child.children()]
     
     @classmethod
     def readFromDimacs(cls, filename) :
@@ -230,7 +300,7 @@ class CNF(Conjunction):
             leafs = {}
             cnf = CNF()
             for line in file:
-                if not line.startswith('p'):
+                if line.strip() and not line.startswith(('p','c','%')):
                     clause = Disjunction([],[cnf])
                     literals = line.split()[:-1]
                     for lit in literals:
@@ -239,6 +309,164 @@ class CNF(Conjunction):
                         clause.add_child(leafs[lit])
         return cnf
                     
+class CompactCNF(object):
+    def __init__(self, literals=None, offsets=None, nr_variables=0):
+        if literals is None:
+            self.__literals = array('i')
+            self.__offsets = array('q',[0])
+        else:
+            self.__literals = literals
+            self.__offsets = offsets
+        self.__nr_variables = nr_variables
+        
+    def add_clause(self, literals):
+        self.__literals.extend(literals)
+        self.__offsets.append(len(self.__literals))
+        for lit in literals:
+            if lit > self.__nr_variables:
+                self.__nr_variables = lit
+            elif -lit > self.__nr_variables:
+                self.__nr_variables = -lit
+                
+    def clause(self, index):
+        return self.__literals[self.__offsets[index]:self.__offsets[index+1]]
+        
+    def clauses(self):
+        literals, offsets = self.__literals, self.__offsets
+        for i in range(0,len(offsets)-1):
+            yield literals[offsets[i]:offsets[i+1]]
+            
+    def nr_variables(self):
+        return self.__nr_variables
+        
+    def nr_literals(self):
+        return len(self.__literals)
+        
+    def __len__(self):
+        return len(self.__offsets) - 1
+        
+    def __iter__(self):
+        return self.clauses()
+        
+    literals = property(lambda s : s.__literals)
+    offsets = property(lambda s : s.__offsets)
+    
+    def toDimacs(self, weights=None, weights_format='problog'):
+        out = io.StringIO()
+        DimacsWriter(weights_format)(self, out, weights)
+        return out.getvalue()
+        
+    @classmethod
+    def readFromDimacs(cls, filename) :
+        return DimacsReader()(filename)
+        
+class DimacsWriter(object):
+    HEADER_WIDTH = 40
+    
+    def __init__(self, weights_format='problog', chunk_size=4096):
+        if weights_format not in ('problog','mcc'):
+            raise LogicException("unknown weights format: " + str(weights_format))
+        self.__weights_format = weights_format
+        self.__chunk_size = chunk_size
+        
+    def __call__(self, cnf, out, weights=None):
+        if isinstance(cnf, CompactCNF):
+            self.__write_header(out, cnf.nr_variables(), len(cnf), weights)
+            self.__write_clauses(out, cnf.clauses())
+        elif weights is None and out.seekable():
+            start = out.tell()
+            out.write(' ' * self.HEADER_WIDTH + '\n')
+            (nr_variables, nr_clauses) = self.__write_clauses(out, cnf.clauses())
+            end = out.tell()
+            out.seek(start)
+            out.write(self.__header(nr_variables, nr_clauses).ljust(self.HEADER_WIDTH))
+            out.seek(end)
+        else:
+            nr_variables, nr_clauses = 0, 0
+            for clause in cnf.clauses():
+                nr_clauses += 1
+                for lit in clause:
+                    nr_variables = max(nr_variables, abs(lit))
+            self.__write_header(out, nr_variables, nr_clauses, weights)
+            self.__write_clauses(out, cnf.clauses())
+            
+    def __header(self, nr_variables, nr_clauses):
+        return 'p cnf ' + str(nr_variables) + ' ' + str(nr_clauses)
+            
+    def __write_header(self, out, nr_variables, nr_clauses, weights):
+        out.write(self.__header(nr_variables, nr_clauses) + '\n')
+        self.__write_weights(out, nr_variables, weights)
+        
+    def __write_weights(self, out, nr_variables, weights):
+        if weights is None:
+            return
+        (positive, negative) = weights.for_variables(nr_variables)
+        if self.__weights_format == 'problog':
+            chunk = ['c weights']
+            for var in range(1,nr_variables+1):
+                chunk.append(str(positive[var-1]))
+                chunk.append(str(negative[var-1]))
+            out.write(' '.join(chunk) + '\n')
+        else:
+            out.write('c t wmc\n')
+            chunk = []
+            for var in range(1,nr_variables+1):
+                chunk.append('c p weight ' + str(var) + ' ' + str(positive[var-1]) + ' 0\n')
+                chunk.append('c p weight -' + str(var) + ' ' + str(negative[var-1]) + ' 0\n')
+                if len(chunk) >= self.__chunk_size:
+                    out.write(''.join(chunk))
+                    chunk = []
+            out.write(''.join(chunk))
+        
+    def __write_clauses(self, out, clauses):
+        nr_variables, nr_clauses = 0, 0
+        chunk = []
+        for clause in clauses:
+            nr_clauses += 1
+            for lit in clause:
+                if lit > nr_variables:
+                    nr_variables = lit
+                elif -lit > nr_variables:
+                    nr_variables = -lit
+            chunk.append(' '.join(map(str,clause)) + ' 0\n')
+            if len(chunk) >= self.__chunk_size:
+                out.write(''.join(chunk))
+                chunk = []
+        out.write(''.join(chunk))
+        return (nr_variables, nr_clauses)
+        
+class DimacsReader(object):
+    COMMENT = re.compile(rb'^[cp%][^\n]*', re.M)
+    
+    def __call__(self, filename):
+        data = utils.read_mapped(filename)
+        try:
+            nr_variables = 0
+            values = array('i')
+            start = 0
+            for match in self.COMMENT.finditer(data):
+                values.extend(map(int, data[start:match.start()].split()))
+                line = match.group()
+                if line.startswith(b'%'):
+                    start = len(data)
+                    break
+                elif line.startswith(b'p'):
+                    nr_variables = int(line.split()[2])
+                start = match.end()
+            values.extend(map(int, data[start:].split()))
+        finally:
+            if hasattr(data, 'close'):
+                data.close()
+        if values and values[-1] != 0:
+            values.append(0)
+        ends = [i for i, value in enumerate(values) if value == 0]
+        offsets = array('q', [0])
+        offsets.extend(end - i for i, end in enumerate(ends))
+        literals = array('i', filter(None, values))
+        if literals:
+            nr_variables = max(nr_variables, max(literals), -min(literals))
+        return CompactCNF(literals, offsets, nr_variables)
+        
 class LogicException(Exception):
     def __init__(self,msg):
         self.__msg = msg
@@ -1,90 +1,212 @@
+import time
 from logic import LogicProgram,Literal
 from weights import Weights
+from utils import trampoline, strongly_connected_components
 
 class LoopBreaker:
-    def __call__(self,logic_program,weights,queries,evidence):
+    def __call__(self,logic_program,weights,queries,evidence,constraints=()):
         self.__original_program = logic_program
         self.__original_weights = weights
         self.__new_program = LogicProgram()
         self.__new_weights = Weights()
         self.__built_rules = {}
-        for lit in queries | evidence:
-            self.__get_rule(lit)
+        self.__unfounded = {}
+        self.__successors = {}
+        self.__component = {}
+        self.__nr_components = 0
+        self.statistics = []
+        self.__constraint_index = self.__index_constraints(constraints)
+        self.__relevant_constraints = []
+        self.__relevant_ids = set([])
+        roots = [abs(lit) for lit in queries | evidence]
+        while roots:
+            components = list(strongly_connected_components(roots, self.__get_new_successors))
+            entries = self.__get_entries(components, roots)
+            for component in components:
+                if len(component) == 1 and not component[0] in self.__successors[component[0]]:
+                    self.__pass_through(component[0])
+                else:
+                    self.__break_loops(component, entries)
+            roots = self.__get_constraint_roots(components)
+        new_constraints = self.__translate_constraints()
         new_evidence = set([])
         for lit in evidence:
             if lit.truth_value:
-                for (new_lit,_) in self.__built_rules[lit]:
+                for (new_lit,_) in self.__built_rules.get(lit,[]):
                     new_evidence.add(new_lit)
             else:
-                for (new_lit,_) in self.__built_rules[-lit]:
+                for (new_lit,_) in self.__built_rules.get(-lit,[]):
                     new_evidence.add(-new_lit)
-        return self.__new_program, self.__new_weights, new_evidence 
-        
-    def  __get_rule(self,lit,ancestors=set([])):
-        if lit.truth_value:
-            atom = lit
+        return self.__new_program, self.__new_weights, new_evidence, new_constraints
+
+    def __index_constraints(self, constraints):
+        # Constraints are indexed on their atoms without rules (the choice nodes), so a
+        # constraint becomes relevant as soon as one of its choices is reached.
+        index = {}
+        for constraint in constraints:
+            for lit in constraint:
+                if not abs(lit) in self.__original_program:
+                    index.setdefault(abs(lit),[]).append(constraint)
+        return index
+
+    def __get_constraint_roots(self, components):
+        roots = []
+        for component in components:
+            for atom in component:
+                for constraint in self.__constraint_index.pop(atom,[]):
+                    if id(constraint) in self.__relevant_ids:
+                        continue
+                    self.__relevant_ids.add(id(constraint))
+                    self.__relevant_constraints.append(constraint)
+                    for lit in constraint:
+                        if not abs(lit) in self.__component:
+                            roots.append(abs(lit))
+        return roots
+
+    def __translate_constraints(self):
+        new_constraints = []
+        for constraint in self.__relevant_constraints:
+            new_constraint = []
+            for lit in constraint:
+                (new_lit,_) = self.__lookup(lit,frozenset())
+                if new_lit is False:
+                    # Inside a cycle only the copies reached from the entries exist yet.
+                    trampoline(self.__get_rule(abs(lit),frozenset()))
+                    (new_lit,_) = self.__lookup(lit,frozenset())
+                if new_lit:
+                    new_constraint.append(new_lit)
+                elif not lit.truth_value:
+                    break
+            else:
+                new_constraints.append(new_constraint)
+        return new_constraints
+
+    def __get_new_successors(self,atom):
+        return [successor for successor in self.__get_successors(atom) if not successor in self.__component]
+
+    def __get_successors(self,atom):
+        if not atom in self.__successors:
+            successors = set([])
+            for rule in self.__original_program[atom]:
+                for lit in rule:
+                    successors.add(abs(lit))
+            self.__successors[atom] = successors
+        return self.__successors[atom]
+
+    def __get_entries(self, components, roots):
+        for component in components:
+            for atom in component:
+                self.__component[atom] = self.__nr_components
+            self.__nr_components += 1
+        entries = set(roots)
+        for component in components:
+            for atom in component:
+                for successor in self.__successors[atom]:
+                    if self.__component[successor] != self.__component[atom]:
+                        entries.add(successor)
+        return entries
+
+    def __pass_through(self,atom):
+        new_rules = []
+        for rule in self.__original_program[atom]:
+            new_rule = set([])
+            for lit in rule:
+                (new_lit,_) = self.__lookup(lit,frozenset())
+                if new_lit:
+                    new_rule.add(new_lit)
+                elif lit.truth_value:
+                    break
+            else:
+                new_rules.append(new_rule)
+        if new_rules or (not atom in self.__original_program and atom in self.__original_weights):
+            self.__add_rules(atom,atom,new_rules,frozenset())
         else:
-            atom = -lit
-            ancestors = set([])
+            self.__unfounded[atom] = [frozenset()]
+
+    def __break_loops(self, component, entries):
+        start = time.time()
+        for atom in component:
+            if atom in entries:
+                trampoline(self.__get_rule(atom,frozenset()))
+        copies = 0
+        for atom in component:
+            for (_,cycles) in self.__built_rules.get(atom,[]):
+                if cycles:
+                    copies += 1
+        self.statistics.append({'size' : len(component), 'copies' : copies, 'time' : time.time() - start})
+
+    def __lookup(self,lit,ancestors):
+        atom = abs(lit)
         for (new_atom,cycles) in self.__built_rules.get(atom,[]):
             if cycles <= ancestors:
                 break
         else:
-            (new_atom,cycles) = self.__build_rule(atom,ancestors)
+            for cycles in self.__unfounded.get(atom,[]):
+                if cycles <= ancestors:
+                    return (None,cycles)
+            return (False,None)
         if lit.truth_value:
             return (new_atom,cycles)
         else:
             return (-new_atom,cycles)
-        
-        
+
+    def __get_rule(self,atom,ancestors):
+        (new_atom,cycles) = self.__lookup(atom,ancestors)
+        if new_atom is False:
+            (new_atom,cycles) = yield self.__build_rule(atom,ancestors)
+        return (new_atom,cycles)
+
     def __build_rule(self,atom,ancestors):
-        if atom in self.__original_program:
-            all_new_rules = []
-            all_new_cycles = set([])
-            for rule in self.__original_program[atom]:
-                if not rule & ancestors:
-                    new_cycles = set([])
-                    new_rule = set([])
-                    for lit in rule:
-                        (new_lit,cycles) = self.__get_rule(lit,ancestors | set([atom]))
-                        if new_lit:
-                            new_cycles = new_cycles | cycles
-                            new_rule.add(new_lit)
-                        else:
-                            new_cycles = cycles
-                            break
+        all_new_rules = []
+        all_new_cycles = set([])
+        ancestors = ancestors | set([atom])
+        for rule in self.__original_program[atom]:
+            if not rule & ancestors:
+                new_cycles = set([])
+                new_rule = set([])
+                for lit in rule:
+                    if self.__component[abs(lit)] == self.__component[atom]:
+                        if not lit.truth_value:
+                            raise LoopBreakingError('negative cycle through ' + str(atom))
+                        (new_lit,cycles) = yield self.__get_rule(lit,ancestors)
                     else:
-                        all_new_rules.append(new_rule)
-                        all_new_cycles = all_new_cycles | new_cycles
-                else:
-                    all_new_cycles = all_new_cycles | (rule & ancestors)
-            all_new_cycles = all_new_cycles - set([atom])
-            if all_new_rules:
-                if all_new_cycles:
-                    new_atom = Literal(atom.atom + '_' + str(len(self.__built_rules.get(atom,[]))),True)
-                else:
-                    new_atom = atom
-                self.__new_weights[new_atom] = self.__original_weights[atom]
-                self.__new_weights[-new_atom] = self.__original_weights[-atom]
-                for rule in all_new_rules:
-                    self.__new_program.add_rule(new_atom, rule)
-                result = (new_atom,all_new_cycles)
-                if atom in self.__built_rules:
-                    self.__built_rules[atom].append(result)
+                        (new_lit,cycles) = self.__lookup(lit,frozenset())
+                    if new_lit:
+                        new_cycles = new_cycles | cycles
+                        new_rule.add(new_lit)
+                    elif not lit.truth_value:
+                        continue
+                    else:
+                        all_new_cycles = all_new_cycles | cycles
+                        break
                 else:
-                    self.__built_rules[atom] = [result] 
-                return result
+                    all_new_rules.append(new_rule)
+                    all_new_cycles = all_new_cycles | new_cycles
+            else:
+                all_new_cycles = all_new_cycles | (rule & ancestors)
+        all_new_cycles = frozenset(all_new_cycles - set([atom]))
+        if all_new_rules:
+            if all_new_cycles:
+                new_atom = Literal(atom.atom + '_' + str(len(self.__built_rules.get(atom,[]))),True)
             else:
-                return (None,all_new_cycles)
-                    
+                new_atom = atom
+            return self.__add_rules(atom,new_atom,all_new_rules,all_new_cycles)
         else:
-            self.__new_weights[atom] = self.__original_weights[atom]
-            self.__new_weights[-atom] = self.__original_weights[-atom]
-            result = (atom,set([]))
-            self.__built_rules[atom] = [result]
-            return result
-            
-            
-            
-        
-        
\ No newline at end of file
+            self.__unfounded.setdefault(atom,[]).append(all_new_cycles)
+            return (None,all_new_cycles)
+
+    def __add_rules(self,atom,new_atom,rules,cycles):
+        self.__new_weights[new_atom] = self.__original_weights[atom]
+        self.__new_weights[-new_atom] = self.__original_weights[-atom]
+        for rule in rules:
+            self.__new_program.add_rule(new_atom, rule)
+        result = (new_atom,cycles)
+        self.__built_rules.setdefault(atom,[]).append(result)
+        return result
+
+class LoopBreakingError(Exception):
+    def __init__(self,msg):
+        self.__msg = msg
+
+    def __str__(self):
+        return 'error while breaking loops: ' + self.__msg
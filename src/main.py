@@ -1,20 +1,164 @@
 #! /usr/bin/env python3
 
-import utils, ground, sys
+import utils, ground, sys, argparse
+from cache import GroundingCache
 from loop_breaking import LoopBreaker
 from clarks_completion import ClarksCompletion
-from logic import CNF
+from logic import CNF, DimacsWriter
+from session import Session
+from wmc import WeightedModelCounter
+from circuit import Circuit, Compiler, CircuitError, cnf_digest
+from relevance import RelevancePruner
+from simplify import CNFSimplifier
+from server import InferenceServer, parse_address
+from metrics import Metrics, program_sizes, cnf_sizes
+from binary import BinaryWriter
+from components import ComponentSplitter, ComponentCounter, write_components
+
+def parse_arguments(argv) :
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infiles', nargs='+')
+    parser.add_argument('-o', '--output', default=None, help='write the CNF to this file instead of stdout')
+    parser.add_argument('--weights', choices=['problog','mcc'], default=None, help='also write the literal weights in this format')
+    parser.add_argument('--probabilities', action='store_true', help='count models in-process and write P(query | evidence) instead of the CNF')
+    parser.add_argument('--compile', action='store_true', help='compile the CNF to a circuit once and get all probabilities from one upward and one downward pass')
+    parser.add_argument('--save-circuit', default=None, metavar='FILE', help='write the compiled circuit to this file in c2d nnf format')
+    parser.add_argument('--save-model', default=None, metavar='FILE', help='write the ground program, the CNF, their weights and the translation to this file in the binary format')
+    parser.add_argument('--load-circuit', default=None, metavar='FILE', help='reuse a circuit saved by --save-circuit for the same program and queries')
+    parser.add_argument('--no-relevance', dest='relevance', action='store_false', help='keep rules and constraints outside the cone of the queries and evidence')
+    parser.add_argument('--simplify', action='store_true', help='remove forced and equivalent variables and redundant clauses from the CNF; this renumbers the variables')
+    parser.add_argument('--grounder', choices=['auto','yap','python'], default='auto', help='grounder backend; auto only uses yap when the program has variables')
+    parser.add_argument('--encoding', choices=ground.GroundProbLogParser.ENCODINGS, default='pairwise', help='clauses that allow at most one choice of an annotated disjunction; sequential and commander are linear in the number of choices')
+    parser.add_argument('--workers', type=int, default=1, help='parse the input and the grounding, and count the components with --split, in this many processes')
+    parser.add_argument('--split', action='store_true', help='count the independent components of the CNF separately and multiply their counts')
+    parser.add_argument('--components', default=None, metavar='DIR', help='write every independent component of the CNF to DIR as DIMACS and weight files')
+    parser.add_argument('--stream', action='store_true', help='pass the program to the grounder and parse its output through named pipes while it grounds, without temporary files')
+    parser.add_argument('--serve', default=None, metavar='ADDRESS', help='keep the model loaded and answer JSON requests on a unix socket path or [host:]port')
+    parser.add_argument('--cache', default=None, help='directory of the on-disk grounding cache')
+    parser.add_argument('--metrics', default=None, metavar='FILE', help='append wall time, CPU time, memory and sizes of every stage to this file as one JSON record')
+    parser.add_argument('--trace-memory', action='store_true', help='also record the peak memory that Python allocates in every stage; this slows the run down')
+    parser.add_argument('--profile', default=None, metavar='STAGE', help='run this stage, e.g. completion, under cProfile')
+    parser.add_argument('--profile-output', default=None, metavar='FILE', help='write the cProfile statistics to this file instead of STAGE.prof')
+    parser.add_argument('--cache-size', type=int, default=1024, help='maximum size of the grounding cache in MB')
+    return parser.parse_args(argv)
 
 def main(argv) :
+    args = parse_arguments(argv)
+    metrics = Metrics(args.trace_memory, args.profile, args.profile_output)
     with utils.WorkEnv('out/',2) as work_env:
-        grounder = ground.Grounder()
-        (rules, constraints, weights, queries, evidence) = grounder(argv, work_env)
+        cache = None
+        if args.cache:
+            cache = GroundingCache(args.cache, args.cache_size << 20)
+        grounder = ground.Grounder(cache, backend=args.grounder, encoding=args.encoding, workers=args.workers, streaming=args.stream)
+        if args.serve:
+            session = Session(args.infiles, work_env, grounder, relevance=args.relevance, simplify=args.simplify)
+            server = InferenceServer(session, parse_address(args.serve), utils.Logger(verbose=1, file=sys.stderr))
+            server.serve_forever()
+            return
+        try:
+            run(args, work_env, grounder, metrics)
+        finally:
+            if args.metrics:
+                with open(args.metrics,'a') as out:
+                    metrics.write(out, argv=argv)
+
+def run(args, work_env, grounder, metrics) :
+    with metrics.stage('grounding') as stage:
+        (rules, constraints, weights, queries, evidence) = grounder(args.infiles, work_env)
+        stage.record(constraints=len(constraints), queries=len(queries), evidence=len(evidence), **program_sizes(rules))
+    if args.relevance:
+        with metrics.stage('relevance') as stage:
+            (rules, constraints, evidence) = prune(rules, constraints, weights, queries, evidence, work_env)
+            stage.record(constraints=len(constraints), evidence=len(evidence), **program_sizes(rules))
+    with metrics.stage('loop_breaking') as stage:
         l = LoopBreaker()
-        (new_rules,new_weights,new_evidence) = l(rules,weights,queries,evidence)
-        c = ClarksCompletion()
-        (completion,translation, cnf_weights) = c(new_rules,new_weights,queries | new_evidence)
-        print(completion.toDimacs())
-        
-    
+        (new_rules,new_weights,new_evidence,new_constraints) = l(rules,weights,queries,evidence,constraints)
+        stage.record(components=len(l.statistics), copies=sum(step['copies'] for step in l.statistics), **program_sizes(new_rules))
+    with metrics.stage('completion') as stage:
+        c = ClarksCompletion(compact=True)
+        (completion,translation, cnf_weights) = c(new_rules,new_weights,queries | new_evidence,new_constraints)
+        stage.record(**cnf_sizes(completion))
+    if args.simplify:
+        with metrics.stage('simplify') as stage:
+            (completion, translation, cnf_weights) = simplify(completion, translation, cnf_weights, queries | evidence | new_evidence, work_env)
+            stage.record(**cnf_sizes(completion))
+    if args.save_model:
+        with metrics.stage('save_model'):
+            BinaryWriter()(args.save_model, rules, constraints, weights, queries, evidence, completion, cnf_weights, translation)
+    parts = None
+    if args.split or args.components:
+        with metrics.stage('split') as stage:
+            splitter = ComponentSplitter()
+            parts = splitter(completion, cnf_weights)
+            if args.components:
+                write_components(parts, args.components)
+            stage.record(**splitter.statistics)
+    circuit = None
+    if args.load_circuit:
+        with metrics.stage('load_circuit') as stage:
+            circuit = Circuit.load(args.load_circuit)
+            if circuit.digest is None:
+                raise CircuitError(args.load_circuit + ' has no digest of the CNF it was compiled from')
+            if circuit.digest != cnf_digest(completion):
+                raise CircuitError(args.load_circuit + ' was compiled from a different CNF')
+            stage.record(nodes=len(circuit), edges=circuit.nr_edges())
+    elif args.compile or args.save_circuit:
+        with metrics.stage('compile') as stage:
+            compiler = Compiler()
+            circuit = compiler(completion)
+            stage.record(nodes=len(circuit), edges=circuit.nr_edges(), **compiler.statistics)
+    if args.save_circuit:
+        with metrics.stage('save_circuit'):
+            circuit.save(args.save_circuit)
+    if args.probabilities:
+        with metrics.stage('counting') as stage:
+            if circuit is None:
+                if args.split:
+                    counter = ComponentCounter(parts, args.workers)
+                else:
+                    counter = WeightedModelCounter(completion, cnf_weights)
+                probabilities = counter.probabilities(queries, evidence, translation)
+                stage.record(**counter.statistics)
+            else:
+                probabilities = circuit.probabilities(cnf_weights, queries, evidence, translation)
+            stage.record(queries=len(probabilities))
+        with metrics.stage('output'):
+            lines = sorted(str(query) + '\t' + str(probabilities[query]) + '\n' for query in probabilities)
+            if args.output:
+                with open(args.output,'w') as out:
+                    out.writelines(lines)
+            else:
+                sys.stdout.writelines(lines)
+        return
+    with metrics.stage('output'):
+        writer = DimacsWriter(args.weights or 'problog')
+        if args.weights is None:
+            cnf_weights = None
+        if args.output:
+            with open(args.output,'w') as out:
+                writer(completion, out, cnf_weights)
+        else:
+            writer(completion, sys.stdout, cnf_weights)
+
+def prune(rules, constraints, weights, queries, evidence, env):
+    pruner = RelevancePruner()
+    result = pruner(rules, constraints, weights, queries, evidence)
+    with open(env.tmp_path('relevance.log'),'w') as logfile:
+        logger = utils.Logger(file = logfile,verbose = 1)
+        for step in pruner.statistics:
+            logger(1,step['step'] + ':',', '.join(key + ' ' + str(step[key]) for key in sorted(step) if key != 'step'),msgtype = 'RESULT')
+    return result
+
+def simplify(cnf, translation, weights, frozen, env):
+    simplifier = CNFSimplifier()
+    result = simplifier(cnf, translation, weights, frozen)
+    with open(env.tmp_path('simplify.log'),'w') as logfile:
+        logger = utils.Logger(file = logfile,verbose = 1)
+        for key in ('before','after'):
+            logger(1,key + ':','variables %d, clauses %d, literals %d' % simplifier.statistics[key],msgtype = 'RESULT')
+        logger(1,'removed:',', '.join(key + ' ' + str(simplifier.statistics[key]) for key in ('units','equivalences','duplicates','subsumed','free')),msgtype = 'RESULT')
+        logger(1,'constant factor:',simplifier.factor,msgtype = 'RESULT')
+    return result
+
 if __name__ == '__main__' :
-    main(sys.argv[1:])
\ No newline at end of file
+    main(sys.argv[1:])
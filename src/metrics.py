@@ -0,0 +1,92 @@
+import cProfile, json, sys, time, tracemalloc
+try :
+    import resource
+except ImportError :
+    resource = None
+
+class Metrics(object) :
+    """Records wall time, CPU time, peak memory and sizes for the stages of one run.
+
+    A stage is measured with `with metrics.stage(name) as stage:`, and stage.record()
+    adds sizes such as atoms, rules or clauses to it. When memory tracing is on, every
+    stage gets the peak of the memory allocated by Python while it ran. The peak RSS
+    of the process so far is always recorded where the platform reports it. One stage
+    can run under cProfile, with its statistics dumped to a file. write() appends the
+    run as a single JSON record on one line."""
+
+    def __init__(self, trace_memory=False, profile=None, profile_output=None) :
+        self.stages = []
+        self.__trace_memory = trace_memory
+        self.__profile = profile
+        self.__profile_output = profile_output or (str(profile) + '.prof')
+        self.__start = (time.time(), time.perf_counter(), time.process_time())
+        if trace_memory and not tracemalloc.is_tracing() :
+            tracemalloc.start()
+
+    def stage(self, name) :
+        return Stage(self, name, self.__trace_memory, self.__profile_output if name == self.__profile else None)
+
+    def record(self, **fields) :
+        (timestamp, wall, cpu) = self.__start
+        result = {'timestamp' : timestamp, 'wall' : time.perf_counter() - wall, 'cpu' : time.process_time() - cpu}
+        if max_rss_kb() is not None :
+            result['max_rss_kb'] = max_rss_kb()
+        result.update(fields)
+        result['stages'] = self.stages
+        return result
+
+    def write(self, out, **fields) :
+        out.write(json.dumps(self.record(**fields), sort_keys=True) + '\n')
+
+class Stage(object) :
+    def __init__(self, metrics, name, trace_memory, profile_output) :
+        self.__metrics = metrics
+        self.__trace_memory = trace_memory
+        self.__profile_output = profile_output
+        self.__profiler = None
+        self.sizes = {'stage' : name}
+
+    def record(self, **sizes) :
+        self.sizes.update(sizes)
+
+    def __enter__(self) :
+        if self.__trace_memory :
+            tracemalloc.reset_peak()
+        if self.__profile_output :
+            self.__profiler = cProfile.Profile()
+            self.__profiler.enable()
+        self.__start = (time.perf_counter(), time.process_time())
+        return self
+
+    def __exit__(self, exc_type, value, traceback) :
+        (wall, cpu) = self.__start
+        self.sizes['wall'] = time.perf_counter() - wall
+        self.sizes['cpu'] = time.process_time() - cpu
+        if self.__profiler is not None :
+            self.__profiler.disable()
+            self.__profiler.dump_stats(self.__profile_output)
+        if self.__trace_memory :
+            self.sizes['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        if max_rss_kb() is not None :
+            self.sizes['max_rss_kb'] = max_rss_kb()
+        if exc_type is not None :
+            self.sizes['error'] = str(value)
+        self.__metrics.stages.append(self.sizes)
+
+def max_rss_kb() :
+    """Returns the peak resident set size of the process in kB, or None where it is not known."""
+    if resource is None :
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    if sys.platform == 'darwin' :
+        return peak // 1024
+    return peak
+
+def program_sizes(program) :
+    """Returns the number of atoms with rules and the number of rules of a LogicProgram."""
+    return {'atoms' : len(program), 'rules' : sum(len(program[head]) for head in program)}
+
+def cnf_sizes(cnf) :
+    """Returns the number of variables, clauses and literals of a CNF."""
+    return {'variables' : cnf.nr_variables(), 'clauses' : len(cnf), 'literals' : cnf.nr_literals()}
@@ -0,0 +1,259 @@
+from logic import LogicProgram
+from utils import strongly_connected_components
+
+class RelevancePruner(object):
+    """Restricts a ground program to what the queries and evidence depend on.
+
+    Works in three steps. First it takes the dependency cone of the queries and
+    evidence, together with the constraints reached through it. Then it propagates the
+    evidence through the rules and constraints. Rules with a false body literal are
+    removed. True literals are dropped from bodies, but only for atoms outside cycles,
+    since there they may be an atom's own support. Every implied literal joins the
+    evidence, so the pruned program conditions on the same worlds. Finally it takes
+    the cone of the simplified program. self.statistics records what every step removed."""
+
+    def __call__(self, logic_program, constraints, weights, queries, evidence):
+        self.statistics = []
+        rules = {}
+        for head in logic_program:
+            rules[head] = [list(body) for body in logic_program[head]]
+        roots = set([abs(lit) for lit in queries | evidence])
+        original_evidence = evidence
+        (rules, constraints) = self.__record('cone', rules, constraints, self.__cone(roots, rules, constraints))
+        propagated = self.__propagate(rules, constraints, weights, evidence)
+        if propagated is None:
+            # Inconsistent evidence: leave it to the counter to report probability zero.
+            self.statistics.append({'step' : 'evidence', 'conflict' : True})
+        else:
+            (new_rules, new_constraints, evidence) = propagated
+            (rules, constraints) = self.__record('evidence', rules, constraints, (new_rules, new_constraints))
+            self.statistics[-1]['implied'] = len(evidence - original_evidence)
+            roots |= set([abs(lit) for lit in evidence])
+            (rules, constraints) = self.__record('cone', rules, constraints, self.__cone(roots, rules, constraints))
+        program = LogicProgram()
+        for head in rules:
+            for body in rules[head]:
+                program.add_rule(head, body)
+        return (program, constraints, evidence)
+
+    def __record(self, step, rules, constraints, result):
+        (new_rules, new_constraints) = result
+        self.statistics.append({
+            'step' : step,
+            'atoms' : len(rules) - len(new_rules),
+            'rules' : sum(map(len, rules.values())) - sum(map(len, new_rules.values())),
+            'constraints' : len(constraints) - len(new_constraints)})
+        return (new_rules, new_constraints)
+
+    def __cone(self, roots, rules, constraints):
+        # Constraints are reached through their atoms without rules, as in LoopBreaker.
+        index = {}
+        for i in range(0,len(constraints)):
+            for lit in constraints[i]:
+                if not abs(lit) in rules:
+                    index.setdefault(abs(lit),[]).append(i)
+        reached = set([])
+        kept = set([])
+        stack = list(roots)
+        while stack:
+            atom = stack.pop()
+            if atom in reached:
+                continue
+            reached.add(atom)
+            for body in rules.get(atom,[]):
+                stack.extend([abs(lit) for lit in body])
+            for i in index.pop(atom,[]):
+                if not i in kept:
+                    kept.add(i)
+                    stack.extend([abs(lit) for lit in constraints[i]])
+        new_rules = dict((atom, rules[atom]) for atom in reached if atom in rules)
+        return (new_rules, [constraints[i] for i in sorted(kept)])
+
+    def __propagate(self, rules, constraints, weights, evidence):
+        # Every body and constraint counts its unassigned literals, every body its false
+        # ones, and every head keeps its live bodies and counts its true ones, so an
+        # assignment only visits the bodies and constraints its atom occurs in.
+        self.__rules = rules
+        self.__constraints = constraints
+        self.__value = {}
+        self.__implied = set([])
+        self.__cyclic = self.__cyclic_atoms(rules)
+        self.__heads = []
+        self.__bodies = []
+        self.__body_ids = {}
+        self.__live = {}
+        self.__true_bodies = {}
+        self.__occurrences = {}
+        for head in rules:
+            self.__body_ids[head] = []
+            self.__true_bodies[head] = 0
+            for body in rules[head]:
+                if not body:
+                    self.__true_bodies[head] += 1
+                for lit in body:
+                    self.__occurrences.setdefault(abs(lit),[]).append((len(self.__bodies), lit.truth_value))
+                self.__body_ids[head].append(len(self.__bodies))
+                self.__heads.append(head)
+                self.__bodies.append(body)
+            self.__live[head] = set(self.__body_ids[head])
+        self.__unknown = [len(body) for body in self.__bodies]
+        self.__false = [0] * len(self.__bodies)
+        self.__constraint_occurrences = {}
+        for i in range(0,len(constraints)):
+            for lit in constraints[i]:
+                self.__constraint_occurrences.setdefault(abs(lit),[]).append((i, lit.truth_value))
+        self.__constraint_unknown = [len(constraint) for constraint in constraints]
+        self.__constraint_true = [0] * len(constraints)
+        self.__queue = []
+        # Atoms without rules and without a weight can never be true.
+        for atom in list(self.__occurrences) + list(self.__constraint_occurrences):
+            if not atom in rules and not atom in weights and not atom in self.__value:
+                self.__value[atom] = False
+                self.__queue.append(atom)
+        for lit in evidence:
+            if not self.__assign(lit):
+                return None
+        while self.__queue:
+            atom = self.__queue.pop()
+            value = self.__value[atom]
+            if not self.__examine_head(atom):
+                return None
+            for (body, truth_value) in self.__occurrences.get(atom,[]):
+                if not self.__examine_body(body, truth_value == value):
+                    return None
+            for (i, truth_value) in self.__constraint_occurrences.get(atom,[]):
+                if not self.__examine_constraint(i, truth_value == value):
+                    return None
+        new_rules = {}
+        for head in rules:
+            new_rules[head] = self.__simplify_rules(head)
+        new_constraints = []
+        for constraint in constraints:
+            if not self.__satisfied(constraint):
+                new_constraints.append([lit for lit in constraint if self.__truth(lit) is None])
+        # A leaf that no rule or constraint mentions any more is fixed and independent of
+        # the rest, so its evidence only scales every count by its weight. A zero weight
+        # makes the evidence impossible, which the unpruned program has to report.
+        present = set([])
+        for head in new_rules:
+            present.add(head)
+            for body in new_rules[head]:
+                present.update([abs(lit) for lit in body])
+        for constraint in new_constraints:
+            present.update([abs(lit) for lit in constraint])
+        new_evidence = set([])
+        for lit in set(evidence) | self.__implied:
+            if abs(lit) in present or abs(lit) in rules or not abs(lit) in weights:
+                new_evidence.add(lit)
+            elif lit in weights and weights[lit] == 0:
+                return None
+        return (new_rules, new_constraints, new_evidence)
+
+    def __cyclic_atoms(self, rules):
+        successors = lambda atom : [abs(lit) for body in rules.get(atom,[]) for lit in body]
+        cyclic = set([])
+        for component in strongly_connected_components(list(rules), successors):
+            if len(component) > 1 or component[0] in successors(component[0]):
+                cyclic.update(component)
+        return cyclic
+
+    def __truth(self, lit):
+        value = self.__value.get(abs(lit))
+        if value is None:
+            return None
+        return value == lit.truth_value
+
+    def __assign(self, lit):
+        truth = self.__truth(lit)
+        if truth is not None:
+            return truth
+        self.__value[abs(lit)] = lit.truth_value
+        self.__implied.add(lit)
+        self.__queue.append(abs(lit))
+        return True
+
+    def __live_rules(self, head):
+        return [self.__bodies[body] for body in self.__body_ids.get(head,[]) if not self.__false[body]]
+
+    def __examine_head(self, head):
+        # The head has just been assigned.
+        if not head in self.__rules:
+            return True
+        live = self.__live[head]
+        value = self.__value[head]
+        if not live:
+            return self.__assign(-head)
+        elif self.__true_bodies[head]:
+            return self.__assign(head)
+        elif value is True and len(live) == 1:
+            return self.__assign_body(next(iter(live)))
+        elif value is False:
+            for body in list(live):
+                if self.__unknown[body] == 1 and not self.__assign_unknown(self.__bodies[body], False):
+                    return False
+        return True
+
+    def __examine_body(self, body, true):
+        # A literal of the body has just been assigned.
+        head = self.__heads[body]
+        live = self.__live[head]
+        value = self.__value.get(head)
+        self.__unknown[body] -= 1
+        if not true:
+            self.__false[body] += 1
+            if self.__false[body] > 1:
+                return True
+            live.discard(body)
+            if not live:
+                return self.__assign(-head)
+            elif self.__true_bodies[head]:
+                return self.__assign(head)
+            elif value is True and len(live) == 1:
+                return self.__assign_body(next(iter(live)))
+            return True
+        if self.__false[body]:
+            return self.__assign(head) if self.__true_bodies[head] else True
+        if not self.__unknown[body]:
+            self.__true_bodies[head] += 1
+        if self.__true_bodies[head]:
+            return self.__assign(head)
+        elif value is False and self.__unknown[body] == 1:
+            return self.__assign_unknown(self.__bodies[body], False)
+        return True
+
+    def __assign_body(self, body):
+        for lit in self.__bodies[body]:
+            if not self.__assign(lit):
+                return False
+        return True
+
+    def __assign_unknown(self, literals, truth_value):
+        # The counters only cover atoms that have left the queue. When the literal they
+        # leave unknown is already assigned, its turn in the queue examines it again.
+        for lit in literals:
+            if self.__truth(lit) is None:
+                return self.__assign(lit if truth_value else -lit)
+        return True
+
+    def __satisfied(self, constraint):
+        return any(self.__truth(lit) for lit in constraint)
+
+    def __examine_constraint(self, i, true):
+        # A literal of the constraint has just been assigned.
+        self.__constraint_unknown[i] -= 1
+        if true:
+            self.__constraint_true[i] += 1
+        if self.__constraint_true[i]:
+            return True
+        elif not self.__constraint_unknown[i]:
+            return False
+        elif self.__constraint_unknown[i] == 1:
+            return self.__assign_unknown(self.__constraints[i], True)
+        return True
+
+    def __simplify_rules(self, head):
+        live = self.__live_rules(head)
+        if not live:
+            # A known false atom keeps its rules, so it does not turn into a free leaf.
+            return self.__rules[head]
+        return [[lit for lit in body if not (self.__truth(lit) and not abs(lit) in self.__cyclic)] for body in live]
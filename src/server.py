@@ -0,0 +1,67 @@
+import io, json, os, socketserver, time
+from logic import DimacsWriter
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, answered with one JSON line.
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            start = time.time()
+            try:
+                response = self.server.answer(json.loads(line.decode()))
+            except Exception as error:
+                response = {'error' : str(error)}
+            response['time'] = time.time() - start
+            self.server.logger(1, 'request answered in', '%.6f' % response['time'], msgtype='TIMER')
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+class InferenceServer(object):
+    def __init__(self, session, address, logger):
+        self.__session = session
+        if isinstance(address, tuple):
+            self.__server = socketserver.ThreadingTCPServer(address, RequestHandler)
+        else:
+            if os.path.exists(address):
+                os.remove(address)
+            self.__server = socketserver.ThreadingUnixStreamServer(address, RequestHandler)
+        self.__server.daemon_threads = True
+        self.__server.answer = self.answer
+        self.__server.logger = logger
+
+    def answer(self, request):
+        (queries, evidence) = self.__session.parse_request(request)
+        if request.get('probabilities'):
+            probabilities = self.__session.probabilities(queries, evidence)
+            return {'probabilities' : dict((str(query), probabilities[query]) for query in probabilities)}
+        (cnf, translation, cnf_weights, new_evidence) = self.__session.completion(queries, evidence)
+        out = io.StringIO()
+        DimacsWriter()(cnf, out, cnf_weights)
+        variables = {}
+        for lit in (queries or self.__session.queries) | new_evidence:
+            atom = abs(lit)
+            if atom in translation:
+                variables[str(atom)] = translation[atom]
+        return {'dimacs' : out.getvalue(), 'variables' : variables}
+
+    def serve_forever(self):
+        try:
+            self.__server.serve_forever()
+        finally:
+            self.__server.server_close()
+
+    def shutdown(self):
+        self.__server.shutdown()
+
+def parse_address(address):
+    # host:port or a port for TCP, anything else is the path of a unix socket, which
+    # can contain ':' as well.
+    (host, separator, port) = address.rpartition(':')
+    if separator and port.isdigit():
+        return (host, int(port))
+    elif address.isdigit():
+        return ('127.0.0.1', int(address))
+    else:
+        return address
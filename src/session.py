@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict
+from ground import Grounder
+from logic import Literal
+from loop_breaking import LoopBreaker
+from relevance import RelevancePruner
+from clarks_completion import ClarksCompletion
+from simplify import CNFSimplifier
+from wmc import WeightedModelCounter, cnf_index, cnf_evidence, conditional_probabilities
+from circuit import Compiler, IncrementalEvaluator
+
+class Session(object):
+    """Keeps a ground model in memory and caches loop breaking and completion results per query set.
+
+    Sessions are shared by the threads of a server. The session lock is only held to
+    read and update the caches, so requests for different query sets are computed at
+    the same time. Every cached counter has a lock of its own, since counting changes
+    the state of its Formula, and the compiled model has one as well."""
+
+    def __init__(self, infiles, env, grounder=None, cache_size=64, relevance=True, simplify=False):
+        if grounder is None:
+            grounder = Grounder()
+        (self.rules, self.constraints, self.weights, self.queries, self.evidence) = grounder(infiles, env)
+        self.__cache_size = cache_size
+        self.__relevance = relevance
+        self.__simplify = simplify
+        self.__loop_breakings = OrderedDict()
+        self.__completions = OrderedDict()
+        self.__counters = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__model_lock = threading.Lock()
+        self.__generation = 0
+        self.__compiler = Compiler()
+        self.__model = None
+        self.__roots = set([])
+        self.__translation = None
+
+    def completion(self, queries=None, evidence=None):
+        if queries is None:
+            queries = self.queries
+        if evidence is None:
+            evidence = self.evidence
+        (new_rules, new_weights, new_evidence, new_constraints, pruned_evidence) = self.loop_breaking(queries, evidence)
+        def complete():
+            completion = ClarksCompletion(compact=True)(new_rules, new_weights, queries | new_evidence, new_constraints)
+            if self.__simplify:
+                completion = CNFSimplifier()(*completion, frozen=queries | pruned_evidence | new_evidence)
+            return completion
+        key = (frozenset(queries), frozenset(evidence))
+        return self.__cached(self.__completions, key, complete) + (new_evidence,)
+
+    def probabilities(self, queries=None, evidence=None):
+        if queries is None:
+            queries = self.queries
+        if evidence is None:
+            evidence = self.evidence
+        (cnf, translation, cnf_weights, new_evidence) = self.completion(queries, evidence)
+        # Relevance pruning adds the literals that the evidence implies.
+        pruned_evidence = self.loop_breaking(queries, evidence)[4]
+        key = (frozenset(queries), frozenset(evidence))
+        (counter, lock) = self.__cached(self.__counters, key, lambda : (WeightedModelCounter(cnf, cnf_weights), threading.Lock()))
+        with lock:
+            return counter.probabilities(queries, pruned_evidence, translation)
+
+    def evaluate(self, queries=None, evidence=None):
+        """Returns P(query | evidence) from a compiled model that is kept between calls.
+
+        Evidence on atoms the model already covers only changes indicators on the
+        circuit. Other atoms are added to the model's roots and the program is
+        recompiled, reusing every component that did not change."""
+        if queries is None:
+            queries = self.queries
+        if evidence is None:
+            evidence = self.evidence
+        with self.__model_lock:
+            atoms = set([abs(lit) for lit in queries | evidence])
+            if self.__model is None or not self.__model.covers(atoms):
+                self.__roots |= atoms
+                self.__model = CompiledModel(self, self.__roots, self.__compiler, self.__translation)
+                self.__translation = self.__model.translation
+            return self.__model.probabilities(queries, evidence)
+
+    def set_weight(self, lit, weight):
+        """Changes the weight of a program literal.
+
+        The weights of atoms without rules, such as choice nodes, are updated in place in
+        the compiled model. Atoms with rules can have loop-breaking copies, so for them
+        the model is rebuilt."""
+        with self.__model_lock:
+            with self.__lock:
+                self.weights[lit] = weight
+                self.__generation += 1
+                self.__loop_breakings.clear()
+                self.__completions.clear()
+                self.__counters.clear()
+            if self.__model is None:
+                return
+            elif abs(lit) in self.rules:
+                self.__model = None
+            else:
+                self.__model.set_weight(lit, weight)
+
+    def loop_breaking(self, queries, evidence):
+        def break_loops():
+            (rules, constraints, pruned_evidence) = (self.rules, self.constraints, evidence)
+            if self.__relevance:
+                (rules, constraints, pruned_evidence) = RelevancePruner()(rules, constraints, self.weights, queries, evidence)
+            l = LoopBreaker()
+            return l(rules, self.weights, queries, pruned_evidence, constraints) + (pruned_evidence,)
+        key = (frozenset(queries), frozenset(evidence))
+        return self.__cached(self.__loop_breakings, key, break_loops)
+
+    def __cached(self, cache, key, make):
+        # A missing entry is made outside the lock, so two threads can make the same
+        # entry at once, and the first one stored is kept. An entry made while
+        # set_weight changed the weights is returned but not stored.
+        with self.__lock:
+            if key in cache:
+                return self.__fetch(cache, key)
+            generation = self.__generation
+        value = make()
+        with self.__lock:
+            if key in cache:
+                return self.__fetch(cache, key)
+            if generation == self.__generation:
+                self.__store(cache, key, value)
+        return value
+
+    def __store(self, cache, key, value):
+        cache[key] = value
+        while len(cache) > self.__cache_size:
+            cache.popitem(last=False)
+
+    def __fetch(self, cache, key):
+        cache.move_to_end(key)
+        return cache[key]
+
+    @classmethod
+    def parse_request(cls, request):
+        queries, evidence = None, None
+        if 'queries' in request:
+            queries = set([Literal.parse(query) for query in request['queries']])
+        if 'evidence' in request:
+            evidence = set([])
+            for atom in request['evidence']:
+                value = request['evidence'][atom]
+                if not isinstance(value, bool):
+                    raise ValueError('evidence on ' + atom + ' has to be true or false, not ' + repr(value))
+                evidence.add(Literal(atom, value))
+        return (queries, evidence)
+
+class CompiledModel(object):
+    """The loop-broken, completed and compiled program for a set of root atoms."""
+
+    def __init__(self, session, roots, compiler, translation=None):
+        self.roots = frozenset(roots)
+        l = LoopBreaker()
+        (rules, weights, _, constraints) = l(session.rules, session.weights, set(roots), set([]), session.constraints)
+        c = ClarksCompletion(compact=True, translation=translation)
+        (self.cnf, self.translation, self.weights) = c(rules, weights, roots, constraints)
+        self.circuit = compiler(self.cnf)
+        self.evaluator = IncrementalEvaluator(self.circuit, self.circuit.literal_weights(self.weights))
+
+    def covers(self, atoms):
+        for atom in atoms:
+            if not atom in self.roots and not atom in self.translation:
+                return False
+        return True
+
+    def set_weight(self, lit, weight):
+        index = cnf_index(lit, self.translation)
+        if index is not None:
+            self.evaluator.set_weight(index, weight)
+
+    def probabilities(self, queries, evidence):
+        self.evaluator.set_evidence(cnf_evidence(evidence, self.translation))
+        (normalization, marginals) = self.evaluator.marginals()
+        return conditional_probabilities(queries, self.translation, normalization, lambda index : marginals.get(index, 0.0))
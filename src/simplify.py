@@ -0,0 +1,213 @@
+from logic import CompactCNF
+from weights import VariableWeights
+from utils import strongly_connected_components
+
+class CNFSimplifier(object):
+    """Shrinks a completed CNF without changing its weighted model count.
+
+    Forced literals are propagated. Literals that the binary clauses make equivalent
+    are replaced by one representative, whose weights absorb those of the others.
+    Duplicate and subsumed clauses are removed. Variables that end up in no clause are
+    dropped. The weights of forced and dropped variables go into self.factor, so the
+    count of the input is self.factor times the count of the output, and conditional
+    probabilities do not change.
+
+    Frozen atoms, e.g. queries and evidence, keep a variable in the output, so they
+    can still be looked up through the translation. The translation that is returned
+    maps atoms to signed variables. An atom can be mapped to the negation of its
+    representative. Atoms whose value is forced are listed in self.eliminated."""
+
+    def __call__(self, cnf, translation, weights, frozen=()):
+        self.factor = 1.0
+        self.eliminated = {}
+        self.statistics = dict((key, 0) for key in ('units', 'equivalences', 'duplicates', 'subsumed', 'free'))
+        self.__clauses = {}
+        self.__next_index = 0
+        self.__keys = {}
+        self.__occurrences = {}
+        self.__value = {}
+        self.__substitution = {}
+        self.__queue = []
+        self.__weights = {}
+        self.__frozen = set([translation[abs(lit)] for lit in frozen if abs(lit) in translation])
+        # Variables that are in no clause to begin with are dropped too, or kept when frozen.
+        variables = set(range(1,cnf.nr_variables()+1))
+        nr_literals = 0
+        clauses = [tuple(clause) for clause in cnf.clauses()]
+        for clause in clauses:
+            nr_literals += len(clause)
+            variables.update([abs(lit) for lit in clause])
+        (positive, negative) = weights.for_variables(cnf.nr_variables(), 1.0)
+        for variable in variables:
+            self.__weights[variable] = positive[variable-1]
+            self.__weights[-variable] = negative[variable-1]
+        self.statistics['before'] = (len(variables), len(clauses), nr_literals)
+        consistent = all(self.__add(clause) for clause in clauses) and self.__propagate()
+        while consistent:
+            changed = self.__substitute_equivalences()
+            if changed is None or not self.__propagate():
+                consistent = False
+            elif not changed:
+                break
+        if not consistent:
+            # An unsatisfiable CNF is left as it is, so the counter reports it.
+            self.factor = 1.0
+            self.eliminated = {}
+            self.statistics['unsatisfiable'] = True
+            self.statistics['after'] = self.statistics['before']
+            return (cnf, translation, weights)
+        self.__remove_subsumed()
+        return self.__result(variables, translation)
+
+    def __add(self, literals):
+        # Adds a clause, after removing false literals. Returns False on a conflict.
+        clause = set([])
+        for lit in literals:
+            value = self.__value.get(abs(lit))
+            if value is None:
+                if -lit in clause:
+                    return True
+                clause.add(lit)
+            elif value == (lit > 0):
+                return True
+        if not clause:
+            return False
+        elif len(clause) == 1:
+            self.__queue.extend(clause)
+            return True
+        key = frozenset(clause)
+        if key in self.__keys:
+            self.statistics['duplicates'] += 1
+            return True
+        index = self.__next_index
+        self.__next_index += 1
+        self.__clauses[index] = key
+        self.__keys[key] = index
+        for lit in key:
+            self.__occurrences.setdefault(lit, set([])).add(index)
+        return True
+
+    def __remove(self, index):
+        key = self.__clauses.pop(index)
+        del self.__keys[key]
+        for lit in key:
+            self.__occurrences[lit].discard(index)
+        return key
+
+    def __propagate(self):
+        while self.__queue:
+            lit = self.__queue.pop()
+            value = self.__value.get(abs(lit))
+            if value is not None:
+                if value != (lit > 0):
+                    return False
+                continue
+            self.__value[abs(lit)] = lit > 0
+            self.statistics['units'] += 1
+            for index in list(self.__occurrences.get(lit, [])):
+                self.__remove(index)
+            for index in list(self.__occurrences.get(-lit, [])):
+                if not self.__add(self.__remove(index)):
+                    return False
+        return True
+
+    def __substitute_equivalences(self):
+        # Literals on a cycle of binary implications are equivalent. Returns None when a
+        # literal is equivalent to its own negation, otherwise whether anything changed.
+        successors = {}
+        for key in self.__clauses.values():
+            if len(key) == 2:
+                (a, b) = key
+                successors.setdefault(-a, []).append(b)
+                successors.setdefault(-b, []).append(a)
+        changed = False
+        for component in strongly_connected_components(list(successors), lambda lit : successors.get(lit, [])):
+            if len(component) == 1:
+                continue
+            members = set(component)
+            if any(-lit in members for lit in members):
+                return None
+            representative = min(component, key=abs)
+            for lit in component:
+                variable = abs(lit)
+                if variable == abs(representative) or variable in self.__substitution:
+                    continue
+                # The mirror component gives the same substitution with both signs flipped.
+                self.__merge(variable, representative if lit > 0 else -representative)
+                changed = True
+        return changed
+
+    def __merge(self, variable, lit):
+        self.__substitution[variable] = lit
+        self.statistics['equivalences'] += 1
+        representative = abs(lit)
+        sign = 1 if lit > 0 else -1
+        self.__weights[representative] *= self.__weights[sign * variable]
+        self.__weights[-representative] *= self.__weights[-sign * variable]
+        if variable in self.__frozen:
+            self.__frozen.add(representative)
+        for index in list(self.__occurrences.get(variable, [])) + list(self.__occurrences.get(-variable, [])):
+            if index in self.__clauses:
+                key = self.__remove(index)
+                self.__add([self.__resolve(other) for other in key])
+
+    def __resolve(self, lit):
+        while abs(lit) in self.__substitution:
+            target = self.__substitution[abs(lit)]
+            lit = target if lit > 0 else -target
+        return lit
+
+    def __remove_subsumed(self):
+        for index in sorted(self.__clauses, key=lambda index : len(self.__clauses[index])):
+            if not index in self.__clauses:
+                continue
+            key = self.__clauses[index]
+            rarest = min(key, key=lambda lit : len(self.__occurrences[lit]))
+            for other in list(self.__occurrences[rarest]):
+                if other != index and key < self.__clauses[other]:
+                    self.__remove(other)
+                    self.statistics['subsumed'] += 1
+
+    def __result(self, variables, translation):
+        used = set([])
+        for key in self.__clauses.values():
+            used.update([abs(lit) for lit in key])
+        units, tautologies = [], []
+        for variable in sorted(variables):
+            if variable in used or variable in self.__substitution:
+                continue
+            value = self.__value.get(variable)
+            if value is not None:
+                lit = variable if value else -variable
+                if variable in self.__frozen or self.__weights[lit] == 0:
+                    units.append(lit)
+                else:
+                    self.factor *= self.__weights[lit]
+            else:
+                total = self.__weights[variable] + self.__weights[-variable]
+                # A tautology keeps the variable visible to counters and compilers.
+                if variable in self.__frozen or total == 0:
+                    tautologies.append(variable)
+                else:
+                    self.factor *= total
+                    self.statistics['free'] += 1
+        kept = sorted(used | set([abs(lit) for lit in units]) | set(tautologies))
+        numbering = dict((variable, i) for (i, variable) in enumerate(kept, 1))
+        renumber = lambda lit : numbering[lit] if lit > 0 else -numbering[-lit]
+        result = CompactCNF()
+        for index in sorted(self.__clauses):
+            result.add_clause(sorted([renumber(lit) for lit in self.__clauses[index]], key=abs))
+        for lit in units:
+            result.add_clause([renumber(lit)])
+        for variable in tautologies:
+            result.add_clause([numbering[variable], -numbering[variable]])
+        new_weights = VariableWeights([self.__weights[variable] for variable in kept], [self.__weights[-variable] for variable in kept])
+        new_translation = {}
+        for atom in translation:
+            lit = self.__resolve(translation[atom])
+            if abs(lit) in numbering:
+                new_translation[atom] = renumber(lit)
+            elif abs(lit) in self.__value:
+                self.eliminated[atom] = self.__value[abs(lit)] == (lit > 0)
+        self.statistics['after'] = (len(kept), len(result), result.nr_literals())
+        return (result, new_translation, new_weights)
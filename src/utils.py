@@ -1,4 +1,4 @@
-import tempfile, os, shutil, sys, signal, time
+import tempfile, os, shutil, sys, signal, time, mmap
 
 # Copyright (C) 2014 Anton Dries
 #
@@ -148,4 +148,66 @@ class KeyIndexDict(object) :
         if index <= 0 :
             raise IndexError
         # throws IndexError
-        return self.__int2key[index-1]
\ No newline at end of file
+        return self.__int2key[index-1]
+        
+def trampoline(generator) :
+    """Runs a recursive generator without using the Python call stack.
+    
+    A generator yields a sub-generator to call it and receives its return value 
+    back through send()."""
+    stack = [generator]
+    value = None
+    while stack :
+        try :
+            call = stack[-1].send(value)
+        except StopIteration as result :
+            stack.pop()
+            value = result.value
+        else :
+            stack.append(call)
+            value = None
+    return value
+        
+def strongly_connected_components(roots, successors) :
+    """Tarjan's algorithm on an explicit stack. Components are yielded children first."""
+    index, lowlink = {}, {}
+    stack, on_stack = [], set([])
+    for root in roots :
+        if root in index :
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work :
+            (node, children) = work[-1]
+            for child in children :
+                if child not in index :
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                elif child in on_stack :
+                    lowlink[node] = min(lowlink[node], index[child])
+            else :
+                work.pop()
+                if work :
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node] :
+                    component = []
+                    while True :
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member == node :
+                            break
+                    yield component
+        
+def read_mapped(filename) :
+    # Memory-maps a file for read-only bulk parsing; mmap refuses empty files.
+    with open(filename, 'rb') as file :
+        if os.fstat(file.fileno()).st_size == 0 :
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
@@ -1,42 +1,192 @@
-from logic import Literal
+import re
+import utils
+from array import array
+from logic import Literal, atoms
+
+MISSING = float('nan')
 
 class Weights:
+    """Literal weights in two float arrays, positive and negative, indexed by atom id.
+
+    A literal without a weight has NaN in its array. The mapping interface takes
+    Literals as keys, and get_many and set_many work on sequences of literals. The
+    weights of CNF variables are in VariableWeights."""
+
     def __init__(self):
-        self.__weights = {}
-        
+        self.__positive = array('d')
+        self.__negative = array('d')
+        self.__size = 0
+
     def __getitem__(self,key):
-        if key not in self.__weights:
+        index = key.index
+        column = self.__positive if index > 0 else self.__negative
+        index = abs(index)
+        if index >= len(column) or column[index] != column[index]:
             raise Exception('no weight for: ' + str(key))
-        else:
-            return self.__weights[key]
-        
+        return column[index]
+
     def __setitem__(self,key,value):
-        self.__weights[key] = value
-        
+        index = key.index
+        self.__reserve(abs(index))
+        column = self.__positive if index > 0 else self.__negative
+        index = abs(index)
+        self.__size -= column[index] == column[index]
+        column[index] = value
+        self.__size += value == value
+
+    def __reserve(self, index):
+        if index >= len(self.__positive):
+            extra = max(index + 1, 2 * len(self.__positive)) - len(self.__positive)
+            self.__positive.extend(array('d', [MISSING]) * extra)
+            self.__negative.extend(array('d', [MISSING]) * extra)
+
+    def get_many(self, lits):
+        """Returns the weights of a sequence of literals as an array."""
+        lits = list(lits)
+        (positive, negative) = (self.__positive, self.__negative)
+        self.__reserve(max([abs(lit.index) for lit in lits], default=0))
+        result = array('d', [positive[index] if index > 0 else negative[-index] for index in [lit.index for lit in lits]])
+        total = sum(result)
+        if total != total:
+            for lit in lits:
+                if not lit in self:
+                    raise Exception('no weight for: ' + str(lit))
+        return result
+
+    def set_many(self, lits, values):
+        """Sets the weights of a sequence of literals to the values at the same positions."""
+        indices = [lit.index for lit in lits]
+        self.__reserve(max(map(abs, indices), default=0))
+        (positive, negative) = (self.__positive, self.__negative)
+        for (index, value) in zip(indices, values):
+            (column, index) = (positive, index) if index > 0 else (negative, -index)
+            self.__size += (value == value) - (column[index] == column[index])
+            column[index] = value
+
+    def __reduce__(self):
+        # Atom ids are only valid in this process, so the weights are pickled by atom name.
+        present = lambda index : self.__positive[index] == self.__positive[index] or self.__negative[index] == self.__negative[index]
+        indices = [index for index in range(1,len(self.__positive)) if present(index)]
+        positive = array('d', [self.__positive[index] for index in indices])
+        negative = array('d', [self.__negative[index] for index in indices])
+        return (restore, ([atoms.name(index) for index in indices], positive, negative))
+
+    positive = property(lambda s : s.__positive)
+    negative = property(lambda s : s.__negative)
+
     def __str__(self):
-        result = ''
-        for lit in self.__weights:
+        lines = []
+        for lit in self:
             if lit.truth_value:
-                result += str(lit) + ' ' + str(self.__weights[lit]) + ' ' + str(self.__weights[-lit]) + '\n'
-        return result
+                lines.append(str(lit) + ' ' + str(self.__positive[lit.index]) + ' ' + str(self.__negative[lit.index]) + '\n')
+        return ''.join(lines)
 
     def __contains__(self, key) :
-        return key in self.__weights
-    
+        index = key.index
+        column = self.__positive if index > 0 else self.__negative
+        index = abs(index)
+        return index < len(column) and column[index] == column[index]
+
+    def __iter__(self) :
+        for index in range(1,len(self.__positive)):
+            for (column, truth_value) in ((self.__positive, True), (self.__negative, False)):
+                if column[index] == column[index]:
+                    yield Literal(atoms.name(index), truth_value)
+
+    def __len__(self) :
+        return self.__size
+
     @classmethod
     def readFromFile(cls, filename) :
-        with open(filename) as file:
-            weights = Weights()
-            for line in file:
-                parts = line.split()
-                lit = Literal.parse(parts[0])
-                weights[lit] = float(parts[1])
-                weights[-lit] = float(parts[2])
-                
-        
-        
-            
-        
-        
-        
-    
\ No newline at end of file
+        parts = utils.read_mapped(filename)[:].decode().split()
+        weights = Weights()
+        for i in range(0,len(parts)-2,3):
+            lit = Literal.parse(parts[i])
+            weights[lit] = float(parts[i+1])
+            weights[-lit] = float(parts[i+2])
+        return weights
+
+def restore(names, positive, negative):
+    """Makes Weights from the names of atoms and the weights of their two literals."""
+    weights = Weights()
+    for (name, weight, negated) in zip(names, positive, negative):
+        lit = Literal(name,True)
+        weights[lit] = weight
+        weights[-lit] = negated
+    return weights
+
+class VariableWeights(object):
+    """The weights of the CNF variables 1..n in two float arrays, with variable v at v-1.
+
+    CNF variables are numbers local to one CNF, so unlike the atoms of Weights they are
+    not interned. Keys are signed variables, as in the clauses, and a missing weight is
+    NaN, as in Weights."""
+
+    def __init__(self, positive=(), negative=()):
+        self.__positive = array('d', positive)
+        self.__negative = array('d', negative)
+
+    def __getitem__(self, lit):
+        column = self.__positive if lit > 0 else self.__negative
+        if abs(lit) > len(column) or column[abs(lit)-1] != column[abs(lit)-1]:
+            raise Exception('no weight for: ' + str(lit))
+        return column[abs(lit)-1]
+
+    def __setitem__(self, lit, value):
+        self.__reserve(abs(lit))
+        column = self.__positive if lit > 0 else self.__negative
+        column[abs(lit)-1] = value
+
+    def __contains__(self, lit):
+        column = self.__positive if lit > 0 else self.__negative
+        return 0 < abs(lit) <= len(column) and column[abs(lit)-1] == column[abs(lit)-1]
+
+    def __reserve(self, variable):
+        if variable > len(self.__positive):
+            extra = variable - len(self.__positive)
+            self.__positive.extend(array('d', [MISSING]) * extra)
+            self.__negative.extend(array('d', [MISSING]) * extra)
+
+    def nr_variables(self):
+        return len(self.__positive)
+
+    def for_variables(self, nr_variables, default=None):
+        """Returns the weights of the positive and negative literals of the variables
+        1..nr_variables as two arrays, with variable v at v-1. A missing weight is
+        default, or an error when default is None."""
+        result = []
+        for (column, sign) in ((self.__positive, ''), (self.__negative, '-')):
+            column = column[:nr_variables]
+            column.extend(array('d', [MISSING]) * (nr_variables - len(column)))
+            total = sum(column)
+            if total != total:
+                for i in range(0,nr_variables):
+                    if column[i] != column[i]:
+                        if default is None:
+                            raise Exception('no weight for: ' + sign + str(i+1))
+                        column[i] = default
+            result.append(column)
+        return tuple(result)
+
+    positive = property(lambda s : s.__positive)
+    negative = property(lambda s : s.__negative)
+
+    def __str__(self):
+        lines = []
+        for variable in range(1,len(self.__positive)+1):
+            if variable in self or -variable in self:
+                lines.append(str(variable) + ' ' + str(self.__positive[variable-1]) + ' ' + str(self.__negative[variable-1]) + '\n')
+        return ''.join(lines)
+
+    @classmethod
+    def readFromDimacs(cls, filename) :
+        data = utils.read_mapped(filename)
+        weights = VariableWeights()
+        for line in re.findall(rb'^c (?:weights|p weight) [^\n]*', data, re.M):
+            parts = line.split()
+            if parts[1] == b'weights':
+                values = array('d', map(float, parts[2:]))
+                weights = VariableWeights(values[0::2], values[1::2])
+            else:
+                weights[int(parts[3])] = float(parts[4])
+        return weights
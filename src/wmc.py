@@ -0,0 +1,277 @@
+from array import array
+from collections import OrderedDict
+from utils import trampoline
+
+class WeightedModelCounter(object):
+    """Exact weighted model counter for a CNF with literal weights.
+
+    Runs a DPLL search with unit propagation. After every decision the residual
+    formula is split into independent components, and the count of every component
+    is cached. A component is identified by its variables and the ids of its clauses,
+    which determine its residual clauses. The cache is bounded by the total number of
+    literals in its components, and the least recently used components are evicted first."""
+
+    def __init__(self, cnf, weights, cache_size=1 << 22):
+        clauses = [tuple(clause) for clause in cnf.clauses()]
+        nr_variables = 0
+        for clause in clauses:
+            for lit in clause:
+                nr_variables = max(nr_variables, abs(lit))
+        self.__formula = Formula(clauses, nr_variables)
+        self.__variables = range(1,nr_variables+1)
+        self.__weights = {}
+        (positive, negative) = weights.for_variables(nr_variables, 1.0)
+        for variable in self.__variables:
+            self.__weights[variable] = positive[variable-1]
+            self.__weights[-variable] = negative[variable-1]
+        self.__cache = OrderedDict()
+        self.__cache_size = cache_size
+        self.__cache_used = 0
+        self.statistics = {'decisions' : 0, 'cache_hits' : 0, 'cache_misses' : 0, 'evictions' : 0}
+
+    def count(self, assumptions=()):
+        """Returns the weighted model count of the CNF conjoined with the given literals."""
+        return trampoline(self.__count_formula(list(assumptions)))
+
+    def probabilities(self, queries, evidence, translation):
+        """Returns P(query | evidence) for every query literal.
+
+        Queries and evidence are literals of the logic program. They are mapped to CNF
+        variables through the translation returned by ClarksCompletion."""
+        assumptions = cnf_evidence(evidence, translation)
+        normalization = self.count(assumptions)
+        return conditional_probabilities(queries, translation, normalization, lambda index : self.count(assumptions + [index]))
+
+    def __count_formula(self, assumptions):
+        formula = self.__formula
+        mark = formula.mark()
+        weight = 0.0
+        if formula.start(assumptions):
+            weight = yield self.__count_branch(mark, self.__variables)
+        formula.undo(mark)
+        return weight
+
+    def __count_component(self, component):
+        (variables, clauses, size, branch) = component
+        key = (variables, clauses)
+        if key in self.__cache:
+            self.statistics['cache_hits'] += 1
+            self.__cache.move_to_end(key)
+            return self.__cache[key][0]
+        self.statistics['cache_misses'] += 1
+        self.statistics['decisions'] += 1
+        formula = self.__formula
+        total = 0.0
+        for lit in (branch, -branch):
+            mark = formula.mark()
+            if formula.assign([lit]):
+                total += yield self.__count_branch(mark, variables)
+            formula.undo(mark)
+        self.__store(key, total, size)
+        return total
+
+    def __count_branch(self, mark, variables):
+        # The weight of the literals assigned since mark and of the free variables,
+        # times the counts of the remaining components.
+        formula = self.__formula
+        weight = 1.0
+        for lit in formula.assigned(mark):
+            weight *= self.__weights[lit]
+        (free, parts) = formula.split(variables)
+        for variable in free:
+            weight *= self.__weights[variable] + self.__weights[-variable]
+        for component in parts:
+            if weight == 0:
+                break
+            weight *= yield self.__count_component(component)
+        return weight
+
+    def __store(self, key, value, size):
+        self.__cache[key] = (value, size)
+        self.__cache_used += size
+        while self.__cache_used > self.__cache_size and len(self.__cache) > 1:
+            (_, (_, evicted)) = self.__cache.popitem(last=False)
+            self.__cache_used -= evicted
+            self.statistics['evictions'] += 1
+
+class Formula(object):
+    """The clauses of a CNF under a partial assignment, for a search that assigns
+    literals, splits the rest of the formula into components and backtracks.
+
+    Every literal has the list of clauses it occurs in, and every clause counts its
+    true literals and its literals that are not false. Assigning a literal, and
+    undoing it, only touches the clauses of the literal and its negation. Assigned
+    literals are kept on a trail, and undo(mark) takes back everything assigned since
+    mark() was called."""
+
+    def __init__(self, clauses, nr_variables):
+        self.clauses = clauses
+        # These are indexed by signed literals. A negative literal wraps around to the
+        # back half, which no positive literal reaches.
+        self.__occurrences = [[] for _ in range(0,2*nr_variables+1)]
+        self.__true = bytearray(2*nr_variables+1)
+        self.__satisfied = array('i', [0]) * len(clauses)
+        self.__open = array('i', [len(clause) for clause in clauses])
+        self.__trail = []
+        for (index, clause) in enumerate(clauses):
+            for lit in clause:
+                self.__occurrences[lit].append(index)
+        self.__units = [clause[0] for clause in clauses if len(clause) == 1]
+        self.__empty = any(not clause for clause in clauses)
+
+    def start(self, literals):
+        """Assigns the literals and the unit clauses of the CNF. Returns False on a conflict."""
+        return not self.__empty and self.assign(list(literals) + self.__units)
+
+    def assign(self, literals):
+        """Assigns the literals and propagates them. Returns False on a conflict, which
+        leaves the assignment to be undone."""
+        (true, occurrences, satisfied, open) = (self.__true, self.__occurrences, self.__satisfied, self.__open)
+        queue = list(literals)
+        conflict = False
+        while queue and not conflict:
+            lit = queue.pop()
+            if true[lit]:
+                continue
+            elif true[-lit]:
+                return False
+            true[lit] = 1
+            self.__trail.append(lit)
+            for index in occurrences[lit]:
+                satisfied[index] += 1
+            # The counters of every clause are updated, even after a conflict, so undo
+            # restores them.
+            for index in occurrences[-lit]:
+                open[index] -= 1
+                if not satisfied[index]:
+                    if open[index] == 0:
+                        conflict = True
+                    elif open[index] == 1:
+                        queue.append(self.__unit(index))
+        return not conflict
+
+    def __unit(self, index):
+        for lit in self.clauses[index]:
+            if not self.__true[-lit]:
+                return lit
+
+    def mark(self):
+        return len(self.__trail)
+
+    def assigned(self, mark):
+        return self.__trail[mark:]
+
+    def undo(self, mark):
+        (true, occurrences, satisfied, open, trail) = (self.__true, self.__occurrences, self.__satisfied, self.__open, self.__trail)
+        while len(trail) > mark:
+            lit = trail.pop()
+            true[lit] = 0
+            for index in occurrences[lit]:
+                satisfied[index] -= 1
+            for index in occurrences[-lit]:
+                open[index] += 1
+
+    def split(self, variables):
+        """Returns the unassigned variables among the given ones that are in no
+        unsatisfied clause, and the components of the unsatisfied clauses that the
+        others are in. A component is a tuple of its sorted variables, its sorted clause
+        ids, its number of unassigned literals and the variable to branch on."""
+        (true, occurrences, satisfied, clauses) = (self.__true, self.__occurrences, self.__satisfied, self.clauses)
+        reached = set([])
+        seen = set([])
+        free, parts = [], []
+        for variable in variables:
+            if variable in reached or true[variable] or true[-variable]:
+                continue
+            reached.add(variable)
+            counts = {variable : 0}
+            ids = []
+            stack = [variable]
+            while stack:
+                current = stack.pop()
+                for lit in (current, -current):
+                    for index in occurrences[lit]:
+                        if satisfied[index] or index in seen:
+                            continue
+                        seen.add(index)
+                        ids.append(index)
+                        # The literals of an unsatisfied clause are false or unassigned.
+                        for other in clauses[index]:
+                            if not true[-other]:
+                                other = abs(other)
+                                if other in counts:
+                                    counts[other] += 1
+                                else:
+                                    counts[other] = 1
+                                    reached.add(other)
+                                    stack.append(other)
+            if ids:
+                component = tuple(sorted(counts))
+                # Of the variables in most clauses, the middle one in numbering order
+                # tends to split chains, which are numbered along the chain, in halves.
+                most = max(counts.values())
+                candidates = [other for other in component if counts[other] == most]
+                parts.append((component, tuple(sorted(ids)), sum(counts.values()), candidates[len(candidates) // 2]))
+            else:
+                free.append(variable)
+        return (free, parts)
+
+def cnf_index(lit, translation):
+    """Returns the signed CNF variable of a program literal, or None when it is not in the CNF."""
+    atom = abs(lit)
+    if not atom in translation:
+        return None
+    elif lit.truth_value:
+        return translation[atom]
+    else:
+        return -translation[atom]
+
+def cnf_evidence(evidence, translation):
+    """Maps evidence to signed CNF variables. Negative evidence on an atom outside the CNF always holds."""
+    assumptions = []
+    for lit in evidence:
+        index = cnf_index(lit, translation)
+        if index is not None:
+            assumptions.append(index)
+        elif lit.truth_value:
+            raise CountingError('evidence on an atom that is not in the completion: ' + str(lit))
+    return assumptions
+
+def conditional_probabilities(queries, translation, normalization, count):
+    """Divides count(index), the count of the evidence and a query, by the count of the evidence alone."""
+    if normalization == 0:
+        raise CountingError('the evidence has probability zero')
+    result = {}
+    for query in queries:
+        index = cnf_index(query, translation)
+        if index is None:
+            result[query] = 0.0 if query.truth_value else 1.0
+        else:
+            result[query] = count(index) / normalization
+    return result
+
+def components(clauses):
+    """Splits clauses into groups that share no variables, using union-find."""
+    parent = {}
+    def find(variable):
+        while parent.get(variable, variable) != variable:
+            parent[variable] = parent.get(parent[variable], parent[variable])
+            variable = parent[variable]
+        return variable
+    for clause in clauses:
+        root = find(abs(clause[0]))
+        for lit in clause[1:]:
+            other = find(abs(lit))
+            if other != root:
+                parent[other] = root
+    result = {}
+    for clause in clauses:
+        result.setdefault(find(abs(clause[0])),[]).append(clause)
+    return list(result.values())
+
+class CountingError(Exception):
+    def __init__(self,msg):
+        self.__msg = msg
+
+    def __str__(self):
+        return 'error while counting models: ' + self.__msg
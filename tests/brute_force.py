@@ -0,0 +1,119 @@
+"""Computes P(query | evidence) of small programs by enumerating their worlds.
+
+A Program is a list of clauses, each a list of heads and a body. A clause with
+probabilities on its heads, a probabilistic fact or an annotated disjunction, makes
+one independent choice per world: one of its heads, or none of them with the rest of
+the probability. The chosen heads of a world and the clauses without probabilities
+are rules, and the world is their well-founded model, computed with alternating
+fixpoints, which is two-valued for the stratified programs of random_program. This
+does not go through the grounder, so it checks the whole pipeline."""
+
+import itertools
+
+class Program(object):
+
+    def __init__(self, clauses, queries, evidence):
+        # clauses are (heads, body) with heads [(probability or None, atom)] and body
+        # [(atom, truth_value)]; queries are atoms and evidence (atom, truth_value).
+        self.clauses = clauses
+        self.queries = queries
+        self.evidence = evidence
+
+    def __str__(self):
+        lines = []
+        for (heads, body) in self.clauses:
+            head = '; '.join([atom if probability is None else '%s::%s' % (probability, atom) for (probability, atom) in heads])
+            literals = [atom if truth_value else '\\+' + atom for (atom, truth_value) in body]
+            lines.append(head + (' :- ' + ', '.join(literals) if literals else '') + '.')
+        lines += ['query(%s).' % atom for atom in self.queries]
+        lines += ['evidence(%s,%s).' % (atom, 'true' if truth_value else 'false') for (atom, truth_value) in self.evidence]
+        return '\n'.join(lines) + '\n'
+
+    def probabilities(self):
+        """Returns P(query | evidence) by query atom, or None when the evidence has
+        probability zero."""
+        (total, counts) = (0.0, dict((atom, 0.0) for atom in self.queries))
+        for (world, probability) in self.worlds():
+            if all([(atom in world) == truth_value for (atom, truth_value) in self.evidence]):
+                total += probability
+                for atom in self.queries:
+                    if atom in world:
+                        counts[atom] += probability
+        if total == 0:
+            return None
+        return dict((atom, counts[atom] / total) for atom in self.queries)
+
+    def worlds(self):
+        rules = [(heads[0][1], body) for (heads, body) in self.clauses if heads[0][0] is None]
+        choices = []
+        for (heads, body) in self.clauses:
+            if heads[0][0] is not None:
+                options = [(probability, [(atom, body)]) for (probability, atom) in heads]
+                rest = 1 - sum([probability for (probability, atom) in heads])
+                if rest > 1e-12:
+                    options.append((rest, []))
+                choices.append(options)
+        for selection in itertools.product(*choices):
+            probability = 1.0
+            chosen = list(rules)
+            for (option_probability, option_rules) in selection:
+                probability *= option_probability
+                chosen += option_rules
+            if probability > 0:
+                yield (model(chosen), probability)
+
+def model(rules):
+    """Returns the true atoms of the well-founded model of rules (head, body)."""
+    upper = None
+    while True:
+        lower = least(rules, lambda atom : upper is not None and not atom in upper)
+        new_upper = least(rules, lambda atom : not atom in lower)
+        if new_upper == upper:
+            break
+        upper = new_upper
+    if lower != upper:
+        raise ValueError('the well-founded model is not two-valued')
+    return lower
+
+def least(rules, negated):
+    # The least model of the rules, with a negative literal true when negated says so.
+    true = set([])
+    changed = True
+    while changed:
+        changed = False
+        for (head, body) in rules:
+            if not head in true and all([atom in true if truth_value else negated(atom) for (atom, truth_value) in body]):
+                true.add(head)
+                changed = True
+    return true
+
+DISJUNCTIONS = {2 : [(0.3, 0.4), (0.5, 0.5)], 3 : [(0.3, 0.4), (0.2, 0.3, 0.1), (0.3, 0.3, 0.4)]}
+
+def random_program(rng, strata=3, width=3):
+    """Returns a stratified Program with positive cycles, annotated disjunctions, two
+    queries and some evidence. Negation only refers to lower strata."""
+    layers = [['s%d_%d' % (stratum, i) for i in range(width)] for stratum in range(strata)]
+    def body(stratum):
+        literals = []
+        for _ in range(rng.randint(1, 2)):
+            if stratum > 0 and rng.random() < 0.3:
+                literals.append((rng.choice(sum(layers[:stratum], [])), False))
+            else:
+                literals.append((rng.choice(sum(layers[:stratum+1], [])), True))
+        return literals
+    clauses = []
+    for (stratum, atoms) in enumerate(layers):
+        for atom in atoms:
+            if stratum == 0 or rng.random() < 0.4:
+                clauses.append(([(rng.choice([0.2, 0.5, 0.7, 1.0]), atom)], []))
+            if stratum > 0 or rng.random() < 0.5:
+                clauses.append(([(None, atom)], body(stratum)))
+        if rng.random() < 0.6:
+            # With and without the choice of none of the heads, which makes up to four
+            # choices, so the commander encoding makes groups.
+            probabilities = rng.choice(DISJUNCTIONS[min(width, 3)])
+            heads = rng.sample(atoms, len(probabilities))
+            clauses.append((list(zip(probabilities, heads)), body(stratum)))
+    atoms = sum(layers, [])
+    evidence = [(atom, rng.random() < 0.5) for atom in rng.sample(atoms, rng.randint(0, 2))]
+    return Program(clauses, rng.sample(atoms, 2), evidence)
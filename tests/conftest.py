@@ -0,0 +1,18 @@
+import os, sys
+import pytest
+
+# The modules live in src/ and import each other by their plain names.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+@pytest.fixture
+def run_main(tmp_path, monkeypatch):
+    """Runs main.py in-process on a program with --probabilities and the given
+    arguments, and returns the probabilities by query."""
+    import main
+    monkeypatch.chdir(tmp_path)
+    def run(program, *arguments):
+        (tmp_path / 'program.pl').write_text(str(program))
+        main.main(['--probabilities', '-o', 'probabilities'] + list(arguments) + ['program.pl'])
+        lines = (tmp_path / 'probabilities').read_text().splitlines()
+        return dict((query, float(probability)) for (query, probability) in [line.split('\t') for line in lines])
+    return run
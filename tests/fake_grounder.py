@@ -0,0 +1,50 @@
+"""Stands in for grounder.pl on programs that are already ground.
+
+Implements the main/4 goal that YapGrounder passes after -g, see its docstring. The
+files can be named pipes. With --fail it exits with status 1 after writing the
+grounding, with --exit it exits with status 1 without opening any file, and with
+--skip-evidence it never opens the evidence file."""
+
+import re, sys
+
+STATEMENT = re.compile(r'(query|evidence)\((.*)\)\.$')
+
+def ground(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        match = STATEMENT.match(line)
+        if match is None:
+            yield ('rule', line)
+        elif match.group(1) == 'query':
+            yield ('query', match.group(2))
+        else:
+            (atom, _, truth) = match.group(2).rpartition(',')
+            if not truth.strip() in ('true', 'false'):
+                (atom, truth) = (match.group(2), 'true')
+            yield ('evidence', atom.strip() + ' ' + truth.strip())
+
+def main(argv):
+    if '--exit' in argv:
+        return 1
+    goal = argv[argv.index('-g') + 1]
+    paths = re.match(r"catch\(main\('(.*)','(.*)','(.*)','(.*)'\),_,halt\(1\)\)\.$", goal).groups()
+    # The outputs are opened in reverse order, and the rules flushed one at a time, as
+    # a grounder that does not know it writes to pipes might.
+    tags = ('rule', 'query', 'evidence')
+    if '--skip-evidence' in argv:
+        tags = tags[:2]
+    outputs = dict((tag, open(path, 'w')) for (tag, path) in reversed(list(zip(tags, paths[1:]))))
+    with open(paths[0]) as program:
+        for (tag, value) in ground(program):
+            if tag in outputs:
+                outputs[tag].write(value + '\n')
+            if tag == 'rule':
+                outputs[tag].flush()
+    for out in outputs.values():
+        out.close()
+    return 1 if '--fail' in argv else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
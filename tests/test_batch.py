@@ -0,0 +1,37 @@
+import pytest
+from logic import CompactCNF
+from circuit import Compiler
+
+numpy = pytest.importorskip('numpy')
+from batch import BatchEvaluator
+
+# a <-> (b or c), with b and c exclusive, and a chain of d, e and f.
+CLAUSES = [[-1, 2, 3], [1, -2], [1, -3], [-2, -3], [-4, 5], [-5, 6]]
+
+@pytest.fixture
+def circuit():
+    cnf = CompactCNF()
+    for clause in CLAUSES:
+        cnf.add_clause(clause)
+    return Compiler()(cnf)
+
+@pytest.mark.parametrize('log_space', [False, True])
+@pytest.mark.parametrize('evidence', [(), (1,), (-5,), (2, -4)])
+def test_marginals(circuit, log_space, evidence):
+    queries = [lit for variable in range(1, 7) for lit in (variable, -variable)]
+    positive = numpy.random.default_rng(7).random((5, 6))
+    negative = 1 - positive
+    # Weight zero on a literal is handled without dividing by it.
+    positive[0, 3] = 0.0
+    result = BatchEvaluator(circuit, log_space=log_space).probabilities(positive, queries, evidence, negative)
+    for row in range(0, 5):
+        weights = {}
+        for variable in range(1, 7):
+            (weights[variable], weights[-variable]) = (positive[row, variable-1], negative[row, variable-1])
+        (normalization, marginals) = circuit.marginals(weights, evidence)
+        expected = [marginals.get(lit, 0.0) / normalization for lit in queries]
+        assert result[row] == pytest.approx(expected, abs=1e-12)
+
+def test_impossible_evidence(circuit):
+    result = BatchEvaluator(circuit).probabilities(numpy.full((2, 6), 0.5), [1], (2, 3))
+    assert numpy.isnan(result).all()
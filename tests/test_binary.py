@@ -0,0 +1,90 @@
+import multiprocessing
+import pytest
+import utils
+from ground import Grounder
+from loop_breaking import LoopBreaker
+from clarks_completion import ClarksCompletion
+from simplify import CNFSimplifier
+from wmc import WeightedModelCounter
+from binary import BinaryWriter, BinaryModel, BinaryFormatError
+
+MODEL = '''0.3::a.
+0.6::b.
+0.2::c1; 0.5::c2 :- a.
+d :- b, c1.
+d :- c2.
+e :- d.
+f :- e.
+e :- f, b.
+g :- not(d), a.
+query(d).
+query(g).
+query(f).
+evidence(b,true).
+'''
+
+def ground(tmp_path):
+    path = tmp_path / 'model.pl'
+    path.write_text(MODEL)
+    with utils.WorkEnv(str(tmp_path / 'out'), utils.WorkEnv.NEVER_KEEP) as env:
+        return Grounder(backend='python')([str(path)], env)
+
+def complete(grounding, simplify):
+    (rules, constraints, weights, queries, evidence) = grounding
+    (rules, weights, new_evidence, constraints) = LoopBreaker()(rules, weights, queries, evidence, constraints)
+    result = ClarksCompletion(compact=True)(rules, weights, queries | new_evidence, constraints)
+    if simplify:
+        result = CNFSimplifier()(*result, frozen=queries | evidence | new_evidence)
+    return result
+
+def write(tmp_path, simplify=False):
+    grounding = ground(tmp_path)
+    (cnf, translation, cnf_weights) = complete(grounding, simplify)
+    path = str(tmp_path / 'model.bin')
+    BinaryWriter()(path, *grounding, cnf=cnf, cnf_weights=cnf_weights, translation=translation)
+    return (path, grounding, (cnf, translation, cnf_weights))
+
+def probabilities(model):
+    counter = WeightedModelCounter(model.cnf(), model.cnf_weights())
+    result = counter.probabilities(model.queries(), model.evidence(), model.translation())
+    return dict((str(query), result[query]) for query in result)
+
+def test_program_matches_text(tmp_path):
+    (path, (rules, constraints, weights, queries, evidence), _) = write(tmp_path)
+    model = BinaryModel(path)
+    assert sorted(str(model.program()).splitlines()) == sorted(str(rules).splitlines())
+    assert sorted(str(model.weights()).splitlines()) == sorted(str(weights).splitlines())
+    assert sorted(map(str, model.constraints())) == sorted(map(str, constraints))
+    assert model.queries() == queries
+    assert model.evidence() == evidence
+
+@pytest.mark.parametrize('simplify', [False, True])
+def test_cnf_matches_dimacs(tmp_path, simplify):
+    (path, _, (cnf, _, cnf_weights)) = write(tmp_path, simplify)
+    model = BinaryModel(path)
+    assert model.cnf().toDimacs(model.cnf_weights()) == cnf.toDimacs(cnf_weights)
+    assert model.cnf().toDimacs(model.cnf_weights(), 'mcc') == cnf.toDimacs(cnf_weights, 'mcc')
+
+@pytest.mark.parametrize('simplify, kind', [(False, utils.KeyIndexDict), (True, dict)])
+def test_translation(tmp_path, simplify, kind):
+    (path, _, (_, translation, _)) = write(tmp_path, simplify)
+    loaded = BinaryModel(path).translation()
+    assert type(translation) is kind
+    assert type(loaded) is kind
+    assert dict((atom, loaded[atom]) for atom in loaded) == dict((atom, translation[atom]) for atom in translation)
+
+def test_load_in_pool_worker(tmp_path):
+    (path, _, _) = write(tmp_path)
+    model = BinaryModel(path)
+    # A spawned worker interns the atoms again, in its own order.
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        assert pool.apply(probabilities, (model,)) == pytest.approx(probabilities(model))
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'model.bin'
+    path.write_bytes(b'')
+    with pytest.raises(BinaryFormatError):
+        BinaryModel(str(path))
+    path.write_bytes(b'PLGB\x02\x00\x00\x00\x00\x00\x00\x00')
+    with pytest.raises(BinaryFormatError):
+        BinaryModel(str(path))
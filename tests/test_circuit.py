@@ -0,0 +1,40 @@
+import os, subprocess, sys
+from logic import CompactCNF
+from circuit import Circuit, Compiler, cnf_digest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'main.py')
+
+def run(tmp_path, program, *arguments):
+    path = tmp_path / 'program.pl'
+    path.write_text(program)
+    return subprocess.run((sys.executable, MAIN, '--probabilities') + arguments + (str(path),),
+                          cwd=str(tmp_path), capture_output=True, text=True)
+
+def cnf(clauses):
+    result = CompactCNF()
+    for clause in clauses:
+        result.add_clause(clause)
+    return result
+
+def test_digest():
+    circuit = Compiler()(cnf([[1, -2], [2, 3]]))
+    assert circuit.digest == cnf_digest(cnf([[3, 2], [-2, 1]]))
+    assert circuit.digest != cnf_digest(cnf([[1, 2], [2, 3]]))
+    assert circuit.digest != cnf_digest(cnf([[1, -2], [2, 3], [-4, 4]]))
+
+def test_save_load(tmp_path):
+    circuit = Compiler()(cnf([[1, -2], [2, 3]]))
+    circuit.save(str(tmp_path / 'circuit.nnf'))
+    loaded = Circuit.load(str(tmp_path / 'circuit.nnf'))
+    assert loaded.digest == circuit.digest
+    assert list(loaded.kinds) == list(circuit.kinds) and list(loaded.edges) == list(circuit.edges)
+
+def test_load_other_program(tmp_path):
+    nnf = str(tmp_path / 'circuit.nnf')
+    saved = run(tmp_path, '0.3::a.\n0.6::b.\nc :- a.\nquery(c).\n', '--save-circuit', nnf)
+    assert saved.stdout == 'c\t0.3\n'
+    loaded = run(tmp_path, '0.3::a.\n0.6::b.\nc :- a.\nquery(c).\n', '--load-circuit', nnf)
+    assert loaded.stdout == 'c\t0.3\n'
+    other = run(tmp_path, '0.3::a.\n0.6::b.\nc :- \\+a.\nquery(c).\n', '--load-circuit', nnf)
+    assert other.returncode != 0 and other.stdout == ''
+    assert 'compiled from a different CNF' in other.stderr
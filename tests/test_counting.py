@@ -0,0 +1,94 @@
+import itertools, random
+import pytest
+from logic import CompactCNF
+from weights import VariableWeights
+from wmc import WeightedModelCounter
+from circuit import Compiler
+from simplify import CNFSimplifier
+from components import ComponentSplitter, ComponentCounter
+from test_relevance import programs
+
+def random_cnf(rng, nr_variables=7, nr_clauses=7):
+    # Short clauses, so there are units, equivalences and several components, and
+    # weights that do not sum to one, some of them zero.
+    cnf = CompactCNF()
+    for _ in range(nr_clauses):
+        variables = rng.sample(range(1, nr_variables+1), rng.randint(1, 3) if rng.random() < 0.2 else rng.randint(2, 3))
+        cnf.add_clause([variable if rng.random() < 0.5 else -variable for variable in variables])
+    if rng.random() < 0.5:
+        (first, second) = rng.sample(range(1, nr_variables+1), 2)
+        cnf.add_clause([first, -second])
+        cnf.add_clause([-first, second])
+    positive = [rng.choice([0.0, 0.3, 0.5, 1.0, 1.5]) for _ in range(nr_variables)]
+    negative = [rng.choice([0.2, 0.7, 1.0]) for _ in range(nr_variables)]
+    return (cnf, VariableWeights(positive, negative))
+
+def enumerate_count(cnf, weights, assumptions=()):
+    total = 0.0
+    nr_variables = cnf.nr_variables()
+    for values in itertools.product([True, False], repeat=nr_variables):
+        lits = [variable if value else -variable for (variable, value) in zip(range(1, nr_variables+1), values)]
+        true = set(lits)
+        if all(lit in true for lit in assumptions) and all(any(lit in true for lit in clause) for clause in cnf.clauses()):
+            weight = 1.0
+            for lit in lits:
+                weight *= weights[lit]
+            total += weight
+    return total
+
+def cnfs(count, seed):
+    rng = random.Random(seed)
+    return [random_cnf(rng) for _ in range(count)]
+
+def assumptions(cnf):
+    return [()] + [(lit,) for variable in range(1, cnf.nr_variables()+1) for lit in (variable, -variable)] + [(1, -2), (-3, 4)]
+
+@pytest.mark.parametrize('cnf,weights', cnfs(20, 11))
+def test_counters(cnf, weights):
+    counter = WeightedModelCounter(cnf, weights)
+    splitter = ComponentSplitter()
+    components = ComponentCounter(splitter(cnf, weights))
+    circuit = Compiler()(cnf)
+    literal_weights = circuit.literal_weights(weights)
+    (normalization, marginals) = circuit.marginals(literal_weights)
+    assert normalization == pytest.approx(enumerate_count(cnf, weights), abs=1e-12)
+    for lits in assumptions(cnf):
+        expected = enumerate_count(cnf, weights, lits)
+        assert counter.count(lits) == pytest.approx(expected, abs=1e-12)
+        assert components.count(lits) == pytest.approx(expected, abs=1e-12)
+        assert circuit.evaluate(literal_weights, lits)[-1] == pytest.approx(expected, abs=1e-12)
+        if len(lits) == 1:
+            assert marginals.get(lits[0], 0.0) == pytest.approx(expected, abs=1e-12)
+
+@pytest.mark.parametrize('cnf,weights', cnfs(20, 12))
+def test_simplifier(cnf, weights):
+    # The frozen variables are still in the CNF, under the returned translation, and
+    # the counts with them only change by the factor.
+    frozen = [1, 2, 3]
+    translation = dict((variable, variable) for variable in range(1, cnf.nr_variables()+1))
+    simplifier = CNFSimplifier()
+    (simplified, new_translation, new_weights) = simplifier(cnf, translation, weights, frozen)
+    counter = WeightedModelCounter(simplified, new_weights)
+    for lits in [()] + [(lit,) for variable in frozen for lit in (variable, -variable)]:
+        renumbered = [new_translation[lit] if lit > 0 else -new_translation[-lit] for lit in lits]
+        assert simplifier.factor * counter.count(renumbered) == pytest.approx(enumerate_count(cnf, weights, lits), abs=1e-12)
+
+# Every way of counting, with each encoding of the annotated disjunctions.
+CONFIGURATIONS = [[], ['--compile'], ['--split'], ['--simplify'], ['--simplify', '--split'], ['--simplify', '--compile']]
+CONFIGURATIONS += [['--encoding', encoding] + arguments for encoding in ('sequential', 'commander') for arguments in CONFIGURATIONS]
+
+@pytest.mark.parametrize('program', programs(6, 25))
+def test_configurations(run_main, program):
+    expected = program.probabilities()
+    for arguments in CONFIGURATIONS:
+        result = run_main(program, *arguments)
+        assert sorted(result) == sorted(expected), arguments
+        for query in expected:
+            assert result[query] == pytest.approx(expected[query], abs=1e-9), arguments
+
+def test_split_workers(run_main):
+    (program,) = programs(1, 26)
+    expected = program.probabilities()
+    result = run_main(program, '--split', '--workers', '2')
+    for query in expected:
+        assert result[query] == pytest.approx(expected[query], abs=1e-9)
@@ -0,0 +1,18 @@
+import pytest
+from logic import Literal
+from ground import GroundProbLogParser, RuleParser, ParseError
+
+def parse(rule):
+    parser = GroundProbLogParser()
+    parser.reset()
+    parser.add_rule(*RuleParser()(rule))
+    return parser.result()
+
+def test_probabilities_above_one():
+    with pytest.raises(ParseError, match='0.6::a;0.5::b'):
+        parse('0.6::a; 0.5::b.')
+
+def test_rounding_above_one():
+    # 0.2+0.4+0.3+0.1 is 1.0000000000000002 in floating point.
+    (_, _, weights, _, _) = parse('0.2::a; 0.4::b; 0.3::c; 0.1::d.')
+    assert weights[Literal('choice_node_0_4', True)] == 0.0
@@ -0,0 +1,39 @@
+import random
+import pytest
+from logic import Literal, LogicProgram
+from weights import Weights
+from relevance import RelevancePruner
+from brute_force import random_program
+
+def atom(name, truth_value=True):
+    return Literal(name, truth_value)
+
+def test_evidence_implies_only_supported_literals():
+    # x3 is false, so x4 is, but nothing follows for x1: the second rule of x3 is
+    # already dead through x4.
+    program, weights = LogicProgram(), Weights()
+    for name in ('x1', 'x4'):
+        (weights[atom(name)], weights[atom(name, False)]) = (0.3, 0.7)
+    program.add_rule(atom('x3'), [atom('x4')])
+    program.add_rule(atom('x3'), [atom('x1'), atom('x3', False), atom('x4')])
+    (rules, constraints, evidence) = RelevancePruner()(program, [], weights, set([atom('x1')]), set([atom('x3', False)]))
+    assert evidence == set([atom('x3', False), atom('x4', False)])
+
+def programs(count, seed):
+    # Random programs whose evidence is possible.
+    rng = random.Random(seed)
+    result = []
+    while len(result) < count:
+        program = random_program(rng)
+        if program.probabilities() is not None:
+            result.append(program)
+    return result
+
+@pytest.mark.parametrize('program', programs(12, 15))
+def test_pruning_preserves_probabilities(run_main, program):
+    expected = program.probabilities()
+    for arguments in ([], ['--no-relevance']):
+        result = run_main(program, *arguments)
+        assert sorted(result) == sorted(expected)
+        for query in expected:
+            assert result[query] == pytest.approx(expected[query], abs=1e-9)
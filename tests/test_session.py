@@ -0,0 +1,67 @@
+import threading
+import pytest
+import utils
+import session as session_module
+from ground import Grounder
+from logic import Literal
+from session import Session
+from server import parse_address
+
+PROGRAM = '''0.3::a.
+0.6::b.
+c :- a.
+d :- a, b.
+query(c).
+query(d).
+'''
+
+@pytest.fixture
+def session(tmp_path):
+    path = tmp_path / 'program.pl'
+    path.write_text(PROGRAM)
+    with utils.WorkEnv(str(tmp_path / 'out'), utils.WorkEnv.NEVER_KEEP) as env:
+        yield Session([str(path)], env, Grounder(backend='python'))
+
+def test_cached_answer_does_not_wait(session, monkeypatch):
+    c, d = Literal('c', True), Literal('d', True)
+    assert session.probabilities(set([c]), set([]))[c] == pytest.approx(0.3)
+    started, release = threading.Event(), threading.Event()
+    class SlowCounter(session_module.WeightedModelCounter):
+        def probabilities(self, *arguments):
+            started.set()
+            release.wait(10)
+            return super(SlowCounter, self).probabilities(*arguments)
+    monkeypatch.setattr(session_module, 'WeightedModelCounter', SlowCounter)
+    results = {}
+    slow = threading.Thread(target=lambda : results.update(session.probabilities(set([d]), set([]))))
+    slow.start()
+    try:
+        assert started.wait(10)
+        assert session.probabilities(set([c]), set([]))[c] == pytest.approx(0.3)
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join()
+    assert results[d] == pytest.approx(0.18)
+
+def test_set_weight(session):
+    c = Literal('c', True)
+    assert session.probabilities(set([c]), set([]))[c] == pytest.approx(0.3)
+    session.set_weight(Literal('choice_node_0_0', True), 0.5)
+    session.set_weight(Literal('choice_node_0_1', True), 0.5)
+    assert session.probabilities(set([c]), set([]))[c] == pytest.approx(0.5)
+
+def test_parse_request():
+    (queries, evidence) = Session.parse_request({'queries' : ['c'], 'evidence' : {'a' : True, 'b' : False}})
+    assert queries == set([Literal('c', True)])
+    assert evidence == set([Literal('a', True), Literal('b', False)])
+    for value in ('false', 0, None):
+        with pytest.raises(ValueError):
+            Session.parse_request({'evidence' : {'a' : value}})
+
+def test_parse_address():
+    assert parse_address('localhost:8000') == ('localhost', 8000)
+    assert parse_address('8000') == ('127.0.0.1', 8000)
+    assert parse_address('/tmp/problog.sock') == '/tmp/problog.sock'
+    assert parse_address('/tmp/a:b/problog.sock') == '/tmp/a:b/problog.sock'
+    assert parse_address('/tmp/problog:sock') == '/tmp/problog:sock'
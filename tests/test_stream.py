@@ -0,0 +1,69 @@
+import os, subprocess, sys
+import pytest
+import utils
+from ground import Grounder
+
+FAKE_GROUNDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_grounder.py')
+
+PROGRAM = '''0.3::a.
+0.6::b.
+0.2::c1; 0.5::c2 :- a.
+0.1::h1; 0.2::h2; 0.3::h3 :- b.
+d :- b, c1.
+d :- c2, not(h2).
+e :- d.
+f :- e.
+e :- f, b.
+g :- not(d), a.
+query(d).
+query(g).
+query(f).
+evidence(b,true).
+evidence(h3,false).
+'''
+
+def canonical(grounding):
+    (rules, constraints, weights, queries, evidence) = grounding
+    return (sorted(str(rules).splitlines()), sorted(map(str, constraints)), sorted(str(weights).splitlines()),
+            sorted(map(str, queries)), sorted(map(str, evidence)))
+
+def ground(tmp_path, program=PROGRAM, **options):
+    path = tmp_path / 'program.pl'
+    path.write_text(program)
+    with utils.WorkEnv(str(tmp_path / 'out'), utils.WorkEnv.NEVER_KEEP) as env:
+        return Grounder(**options)([str(path)], env)
+
+def fake(*arguments):
+    return (sys.executable, FAKE_GROUNDER) + arguments
+
+@pytest.mark.parametrize('encoding', ['pairwise', 'sequential'])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_stream_matches_files(tmp_path, encoding, workers):
+    files = ground(tmp_path, command=fake(), backend='yap', encoding=encoding, workers=workers)
+    stream = ground(tmp_path, command=fake(), backend='yap', encoding=encoding, workers=workers, streaming=True)
+    python = ground(tmp_path, backend='python', encoding=encoding)
+    assert canonical(stream) == canonical(files)
+    assert canonical(files) == canonical(python)
+
+@pytest.mark.parametrize('failure', ['--fail', '--exit'])
+@pytest.mark.parametrize('streaming', [False, True])
+def test_grounder_failure(tmp_path, streaming, failure):
+    with pytest.raises(subprocess.CalledProcessError):
+        ground(tmp_path, command=fake(failure), backend='yap', streaming=streaming)
+
+def test_stream_writes_no_files(tmp_path):
+    (tmp_path / 'out').mkdir()
+    ground(tmp_path, command=fake(), backend='yap', streaming=True)
+    assert [name for name in os.listdir(str(tmp_path / 'out')) if not name.endswith('.log')] == []
+
+def test_stream_unopened_file(tmp_path):
+    (_, _, _, queries, evidence) = ground(tmp_path, command=fake('--skip-evidence'), backend='yap', streaming=True)
+    assert sorted(map(str, queries)) == ['d', 'f', 'g'] and len(evidence) == 0
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_stream_large_program(tmp_path, workers):
+    # More than a pipe buffer of program and of grounding.
+    program = ''.join('0.5::a%d.\nb%d :- a%d.\nquery(b%d).\n' % (i, i, i, i) for i in range(5000))
+    files = ground(tmp_path, program, command=fake(), backend='yap', workers=workers)
+    stream = ground(tmp_path, program, command=fake(), backend='yap', workers=workers, streaming=True)
+    assert canonical(stream) == canonical(files)
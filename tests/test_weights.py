@@ -0,0 +1,34 @@
+import pickle
+import pytest
+from array import array
+from logic import Literal, atoms
+from weights import Weights, VariableWeights
+
+def test_variables_not_interned():
+    before = len(atoms)
+    weights = VariableWeights([0.3, 1.0], [0.7, 1.0])
+    weights[3] = 0.5
+    assert weights.for_variables(4, 1.0) == (array('d', [0.3, 1.0, 0.5, 1.0]), array('d', [0.7, 1.0, 1.0, 1.0]))
+    assert len(atoms) == before
+    assert len(weights.positive) == 3
+
+def test_variables_missing():
+    weights = VariableWeights([0.3], [0.7])
+    with pytest.raises(Exception, match='no weight for: -2'):
+        weights[2] = 0.5
+        weights.for_variables(2)
+    assert weights[-1] == 0.7 and 2 in weights and not -2 in weights
+    assert pickle.loads(pickle.dumps(weights)).for_variables(2, 1.0) == weights.for_variables(2, 1.0)
+
+def test_get_set_many():
+    weights = Weights()
+    lits = [Literal('test_weights_a', True), Literal('test_weights_b', False)]
+    weights.set_many(lits, [0.25, 0.5])
+    assert weights.get_many(lits) == array('d', [0.25, 0.5])
+    assert len(weights) == 2
+    weights.set_many(lits[:1], [0.75])
+    assert weights[lits[0]] == 0.75 and len(weights) == 2
+    with pytest.raises(Exception, match='no weight for: -test_weights_a'):
+        weights.get_many([lits[0], -lits[0]])
+    with pytest.raises(Exception, match='test_weights_c'):
+        weights.get_many([Literal('test_weights_c', True)])